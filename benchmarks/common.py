@@ -0,0 +1,106 @@
+# common.py
+#
+# Copyright 2026 Golodnikov Sergey
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty
+# of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+
+# helpers shared by the benchmark scripts
+
+import importlib
+import importlib.util
+import os
+import sys
+import time
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def package():
+    # the sources are installed as "imageflow", in the tree they are in src/
+    if 'imageflow' not in sys.modules:
+        src = os.path.join(ROOT, 'src')
+        spec = importlib.util.spec_from_file_location(
+            'imageflow', os.path.join(src, '__init__.py'),
+            submodule_search_locations=[src],
+        )
+        module = importlib.util.module_from_spec(spec)
+        sys.modules['imageflow'] = module
+        spec.loader.exec_module(module)
+        # Gtk free modules only
+        for name in ('animation', 'backend', 'cache', 'child', 'command',
+                     'data', 'estimate', 'jobs', 'parallel', 'probe',
+                     'quantize', 'rendition', 'segment'):
+            importlib.import_module(f'imageflow.{name}')
+    return sys.modules['imageflow']
+
+
+def child(cmd: list, collect=False):
+    # finished process, the same runner as the application
+    process = package().child.run(cmd, collect=collect)
+    if process.returncode != 0:
+        raise RuntimeError(f'{cmd[0]} failed: {process.error}')
+    return process
+
+
+def run(cmd: list):
+    # wall time of a child process
+    return measure(cmd)[0]
+
+
+def measure(cmd: list):
+    # wall time and peak RSS (bytes) of a child process
+    start = time.monotonic()
+    process = child(cmd)
+    elapsed = time.monotonic() - start
+    # kilobytes on Linux
+    rss = process.usage.ru_maxrss * 1024 if process.usage else 0
+    return elapsed, rss
+
+
+def palette_colors(path: str):
+    # 16x16 palette image as a list of (r, g, b)
+    raw = child(
+        ['ffmpeg', '-v', 'error', '-i', path,
+         '-f', 'rawvideo', '-pix_fmt', 'rgb24', '-'],
+        collect=True,
+    ).output
+    colors = [tuple(raw[i:i + 3]) for i in range(0, len(raw) - 2, 3)]
+    return sorted(set(colors))
+
+
+def lab(rgb: tuple):
+    # sRGB (D65) to CIELAB
+    def linear(c):
+        c /= 255
+        return c / 12.92 if c <= 0.04045 else ((c + 0.055) / 1.055) ** 2.4
+
+    r, g, b = (linear(c) for c in rgb)
+    x = (0.4124 * r + 0.3576 * g + 0.1805 * b) / 0.95047
+    y = 0.2126 * r + 0.7152 * g + 0.0722 * b
+    z = (0.0193 * r + 0.1192 * g + 0.9505 * b) / 1.08883
+
+    def f(t):
+        return t ** (1 / 3) if t > 0.008856 else 7.787 * t + 16 / 116
+
+    fx, fy, fz = f(x), f(y), f(z)
+    return (116 * fy - 16, 500 * (fx - fy), 200 * (fy - fz))
+
+
+def delta_e(a: tuple, b: tuple):
+    # CIE76
+    return sum((i - j) ** 2 for i, j in zip(a, b)) ** 0.5
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+
+# decimate.py
+#
+# Copyright 2026 Golodnikov Sergey
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty
+# of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+
+# duplicate frame dropping against the plain conversion: frames, time and
+# size; without arguments a synthetic slide show is used
+#
+# python3 benchmarks/decimate.py [clip.mp4 ...] [--threshold 5 10]
+
+import argparse
+import os
+import tempfile
+
+import common
+
+
+def slides(directory: str):
+    # one new picture per second, 10 s
+    path = os.path.join(directory, 'slides.mkv')
+    common.run([
+        'ffmpeg', '-v', 'error', '-f', 'lavfi',
+        '-i', 'testsrc2=size=1280x720:rate=1:duration=10',
+        '-r', '30', '-c:v', 'libx264', '-qp', '0', '-preset', 'ultrafast',
+        '-y', path,
+    ])
+    return path
+
+
+def convert(source: str, options: dict, settings: dict, file_format: str,
+            directory: str):
+    imageflow = common.package()
+    args = imageflow.command.preparation(options, settings, file_format)
+    result = os.path.join(directory, 'result' + file_format)
+    palette = os.path.join(directory, 'palette.png')
+    elapsed = 0.0
+    for _stage, cmd in imageflow.command.generate(
+            ['-i', source], args, file_format, result, palette):
+        elapsed += common.run(cmd)
+    _, frames = imageflow.probe.keyframes(result)
+    return elapsed, os.path.getsize(result), frames
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Duplicate frame dropping against the plain conversion.')
+    parser.add_argument('sources', nargs='*')
+    parser.add_argument('--format', choices=('gif', 'webp'), default='gif')
+    parser.add_argument('--fps', type=int, default=15)
+    parser.add_argument('--width', type=int, default=640)
+    parser.add_argument('--threshold', type=int, nargs='+', default=[5])
+    args = parser.parse_args()
+
+    data = common.package().data
+    options = dict(data.defaults, **{
+        'image-width': args.width, 'fps': args.fps, 'ratio': True})
+    file_format = '.' + args.format
+
+    print(f'{"source":<24} {"threshold":>9} {"frames":>7} {"time, s":>8} '
+          f'{"size, KB":>9} {"time":>7} {"size":>7}')
+    with tempfile.TemporaryDirectory() as tmp:
+        sources = args.sources or [slides(tmp)]
+        for source in sources:
+            name = os.path.basename(source)[:24]
+            settings = dict(data.defaults, decimate=False)
+            base = convert(source, options, settings, file_format, tmp)
+            print(f'{name:<24} {"-":>9} {base[2]:7d} {base[0]:8.2f} '
+                  f'{base[1] / 1024:9.1f} {"":>7} {"":>7}')
+            for threshold in args.threshold:
+                settings = dict(data.defaults, **{
+                    'decimate': True, 'decimate-threshold': threshold})
+                t, size, frames = convert(
+                    source, options, settings, file_format, tmp)
+                print(f'{name:<24} {threshold:9d} {frames:7d} {t:8.2f} '
+                      f'{size / 1024:9.1f} {1 - t / base[0]:7.1%} '
+                      f'{1 - size / base[1]:7.1%}')
+
+
+if __name__ == '__main__':
+    main()
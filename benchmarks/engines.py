@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+
+# engines.py
+#
+# Copyright 2026 Golodnikov Sergey
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty
+# of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+
+# the ffmpeg and PyAV engines on the same jobs: the analysis must give the
+# same values and the outputs the same frames (count, size, SSIM against
+# each other), the time of both is printed; the exit status is 1 if
+# anything differs, 2 without PyAV
+#
+# python3 benchmarks/engines.py [clip.mp4 ...] [--format gif webp]
+
+import argparse
+import os
+import re
+import sys
+import tempfile
+import time
+
+import common
+
+
+SSIM = 0.995
+
+# (name, start, end) in seconds, None for the whole file
+RANGES = (
+    ('whole', None, None),
+    ('trim', 1.3, 2.7),
+)
+
+
+def clip(directory: str):
+    # 480p, a keyframe every second
+    path = os.path.join(directory, 'clip.mkv')
+    common.run([
+        'ffmpeg', '-v', 'error', '-f', 'lavfi',
+        '-i', 'testsrc2=size=854x480:rate=30:duration=4',
+        '-c:v', 'libx264', '-g', '30', '-preset', 'ultrafast',
+        '-y', path,
+    ])
+    return path
+
+
+def frames(path: str):
+    # count and size of the decoded frames
+    out = common.child(
+        ['ffprobe', '-v', 'error', '-count_frames', '-select_streams', 'v:0',
+         '-show_entries', 'stream=nb_read_frames,width,height',
+         '-of', 'csv=p=0', path],
+        collect=True,
+    ).output.decode()
+    width, height, count = out.strip().split(',')[:3]
+    return int(count), (int(width), int(height))
+
+
+def ssim(a: str, b: str):
+    err = common.child(
+        ['ffmpeg', '-hide_banner', '-nostats', '-i', a, '-i', b,
+         '-lavfi', '[0:v]format=rgb24[x]; [1:v]format=rgb24[y]; [x][y]ssim',
+         '-f', 'null', '-'],
+    ).error
+    found = re.search(r'SSIM .*All:([\d.]+)', err)
+    return float(found.group(1)) if found else None
+
+
+def convert(imageflow, engine, source: str, meta: dict, keyframes: list,
+            span: tuple, args: tuple, file_format: str, directory: str):
+    start, end = span
+    start = 0 if start is None else round(start * 1000000)
+    end = meta['duration'] if end is None else round(end * 1000000)
+    src, trim = imageflow.command.seek(
+        source, start, end, meta['duration'], keyframes)
+    job = imageflow.jobs.Job(
+        directory, source, src, args, file_format,
+        (meta['width'], meta['height']), end - start,
+        trim=trim, engine=engine,
+    )
+    began = time.monotonic()
+    if not job.run():
+        raise RuntimeError(f'{engine.name}: {job.stage} error: {job.error}')
+    return time.monotonic() - began, job
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Output equivalence of the ffmpeg and PyAV engines.')
+    parser.add_argument('sources', nargs='*')
+    parser.add_argument('--format', nargs='+', choices=('gif', 'webp'),
+                        default=['gif', 'webp'])
+    parser.add_argument('--fps', type=int, default=15)
+    parser.add_argument('--width', type=int, default=480)
+    parser.add_argument('--ssim', type=float, default=SSIM)
+    args = parser.parse_args()
+
+    imageflow = common.package()
+    backend, data = imageflow.backend, imageflow.data
+    if backend.PYAV is None:
+        print('PyAV is not installed', file=sys.stderr)
+        return 2
+    engines = (backend.SUBPROCESS, backend.PYAV)
+
+    differences = 0
+    with tempfile.TemporaryDirectory() as tmp:
+        for source in args.sources or [clip(tmp)]:
+            name = os.path.basename(source)
+            analysis = [(e.info(source), e.keyframes(source)) for e in engines]
+            (meta, keyframes), other = analysis
+            for key in ('width', 'height', 'codec', 'start'):
+                if meta[key] != other[0][key]:
+                    differences += 1
+                    print(f'{name}: {key} {meta[key]} != {other[0][key]}')
+            if keyframes != other[1]:
+                differences += 1
+                print(f'{name}: keyframes differ')
+
+            options = dict(data.defaults, **{
+                'image-width': args.width, 'fps': args.fps, 'ratio': True})
+            for file_format in ('.' + f for f in args.format):
+                cmd_args = imageflow.command.preparation(
+                    options, dict(data.defaults), file_format)
+                for label, *span in RANGES:
+                    results = [convert(
+                        imageflow, e, source, meta, keyframes[0], span,
+                        cmd_args, file_format, tmp) for e in engines]
+                    (t1, a), (t2, b) = results
+                    fa, fb = frames(a.result), frames(b.result)
+                    value = ssim(a.result, b.result)
+                    same = fa == fb and value is not None and \
+                        value >= args.ssim
+                    differences += not same
+                    print(f'{name} {file_format} {label}: '
+                          f'ffmpeg {t1:.2f} s, PyAV {t2:.2f} s, '
+                          f'frames {fa[0]}/{fb[0]}, size {fa[1]}/{fb[1]}, '
+                          f'SSIM {value}{"" if same else " DIFFERENT"}')
+                    for _, job in results:
+                        job.cleanup()
+    print(f'{differences} differences')
+    return 1 if differences else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
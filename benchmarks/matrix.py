@@ -0,0 +1,267 @@
+#!/usr/bin/env python3
+
+# matrix.py
+#
+# Copyright 2026 Golodnikov Sergey
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty
+# of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+
+# scaler × dither × stats-mode × optimize level on synthetic sources:
+# wall time, peak RSS of the ffmpeg processes, output size, SSIM and PSNR
+# against the source; WebP has no dither and palette, only the scalers
+# and the optimize levels are varied for it; the GIF maximum level is
+# the balanced one and is not run
+#
+# python3 benchmarks/matrix.py run --out base.json
+# python3 benchmarks/matrix.py run --out new.json --scaler lanczos
+# python3 benchmarks/matrix.py run --out webp.json --format webp
+# python3 benchmarks/matrix.py compare base.json new.json
+
+import argparse
+import datetime
+import json
+import os
+import platform
+import re
+import statistics
+import sys
+import tempfile
+
+import common
+
+
+SOURCES = {
+    'testsrc': 'testsrc2=size={}x{}:rate=30:duration={}',
+    'mandelbrot': 'mandelbrot=size={}x{}:rate=30,trim=duration={}',
+}
+
+SIZES = {
+    '480p': (854, 480),
+    '1080p': (1920, 1080),
+    '4k': (3840, 2160),
+}
+
+# relative thresholds for compare
+TIME = 0.10
+RSS = 0.10
+BYTES = 0.01
+SSIM = 0.005
+
+
+def source(directory: str, kind: str, size: str, duration: int):
+    # lossless H.264, generated once and kept between runs
+    path = os.path.join(directory, f'{kind}-{size}-{duration}s.mkv')
+    if not os.path.exists(path):
+        lavfi = SOURCES[kind].format(*SIZES[size], duration)
+        tmp = path + '.tmp.mkv'
+        common.run([
+            'ffmpeg', '-v', 'error', '-f', 'lavfi', '-i', lavfi,
+            '-c:v', 'libx264', '-qp', '0', '-preset', 'ultrafast',
+            '-pix_fmt', 'yuv444p', '-y', tmp,
+        ])
+        os.replace(tmp, path)
+    return path
+
+
+def quality(result: str, path: str, options: dict):
+    # the source is brought to the output size and frame rate
+    graph = (
+        f"[0:v]format=rgb24,split [a][b]; "
+        f"[1:v]fps={options['fps']},"
+        f"scale={options['image-width']}:{options['image-height']}"
+        f":flags=bicubic,format=rgb24,split [c][d]; "
+        f"[a][c] ssim; [b][d] psnr"
+    )
+    # the summaries are the last lines of the log
+    err = common.child(
+        ['ffmpeg', '-hide_banner', '-nostats', '-i', result, '-i', path,
+         '-lavfi', graph, '-f', 'null', '-'],
+    ).error
+    ssim = re.search(r'SSIM .*All:([\d.]+)', err)
+    psnr = re.search(r'PSNR .*average:([\d.]+|inf)', err)
+    return (float(ssim.group(1)) if ssim else None,
+            float(psnr.group(1)) if psnr else None)
+
+
+def encode(imageflow, path: str, options: dict, settings: dict,
+           file_format: str, workspace: str):
+    # the same commands as the application, stage by stage
+    args = imageflow.command.preparation(options, settings, file_format)
+    result = os.path.join(workspace, 'result' + file_format)
+    palette = os.path.join(workspace, 'palette.png')
+    elapsed, rss = 0.0, 0
+    for _stage, cmd in imageflow.command.generate(
+            ['-i', path], args, file_format, result, palette,
+            single_pass=settings['single-pass']):
+        t, r = common.measure(cmd)
+        elapsed, rss = elapsed + t, max(rss, r)
+    return elapsed, rss, result
+
+
+def ffmpeg_version():
+    out = common.child(['ffmpeg', '-version'], collect=True).output
+    return out.decode('utf-8', 'replace').splitlines()[0]
+
+
+def run(args):
+    imageflow = common.package()
+    data = imageflow.data
+    os.makedirs(args.sources, exist_ok=True)
+
+    settings = dict(data.defaults)
+    settings['single-pass'] = args.single_pass
+    report = {
+        'date': datetime.datetime.now().isoformat(timespec='seconds'),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'ffmpeg': ffmpeg_version(),
+        'duration': args.duration,
+        'repeat': args.repeat,
+        'results': [],
+    }
+
+    gif = [(d, st) for d in args.dither for st in args.stats_mode]
+    matrix = [(f, k, s, sc, d, st, o)
+              for f in args.format for k in args.kind for s in args.size
+              for sc in args.scaler
+              for d, st in (gif if f == 'gif' else [('-', '-')])
+              for o in args.optimize
+              if f == 'webp' or o != 'maximum']
+    with tempfile.TemporaryDirectory() as workspace:
+        for n, case in enumerate(matrix, 1):
+            file_format, kind, size, scaler, dither, stats, optimize = case
+            path = source(args.sources, kind, size, args.duration)
+            width, height = SIZES[size]
+            options = {
+                'image-width': args.width,
+                'image-height': round(args.width * height / width / 2) * 2,
+                'scaler': data.scaler.index(scaler),
+                'ratio': False,
+                'fps': args.fps,
+                'max-colors': args.max_colors,
+                'dither': data.dither.index(dither) if dither != '-' else 0,
+            }
+            if stats != '-':
+                settings['stats-mode'] = data.palette.index(stats)
+            settings['optimize'] = data.optimize.index(optimize)
+            times, rss = [], 0
+            for _ in range(args.repeat):
+                t, r, result = encode(
+                    imageflow, path, options, settings, '.' + file_format,
+                    workspace)
+                times.append(t)
+                rss = max(rss, r)
+            ssim, psnr = quality(result, path, options)
+            record = {
+                'format': file_format, 'source': kind, 'size': size,
+                'scaler': scaler, 'dither': dither, 'stats-mode': stats,
+                'optimize': optimize,
+                'time': statistics.median(times), 'rss': rss,
+                'bytes': os.path.getsize(result),
+                'ssim': ssim, 'psnr': psnr,
+            }
+            report['results'].append(record)
+            print(f'[{n}/{len(matrix)}] {" ".join(case)}: '
+                  f'{record["time"]:.2f} s, '
+                  f'{rss / 1024 ** 2:.0f} MB, {record["bytes"]} B, '
+                  f'SSIM {ssim}', flush=True)
+
+    with open(args.out, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=1)
+    return 0
+
+
+def compare(args):
+    def load(path: str):
+        with open(path, encoding='utf-8') as f:
+            report = json.load(f)
+        return {(r['format'], r['source'], r['size'], r['scaler'],
+                 r['dither'], r['stats-mode'], r['optimize']): r
+                for r in report['results']}
+
+    base, new = load(args.base), load(args.new)
+    regressions = 0
+    for key in sorted(base.keys() & new.keys()):
+        a, b = base[key], new[key]
+        found = []
+        if b['time'] > a['time'] * (1 + args.time):
+            found.append(f'time {a["time"]:.2f} -> {b["time"]:.2f} s')
+        if b['rss'] > a['rss'] * (1 + args.rss):
+            found.append(f'RSS {a["rss"] / 1024 ** 2:.0f} -> '
+                         f'{b["rss"] / 1024 ** 2:.0f} MB')
+        if b['bytes'] > a['bytes'] * (1 + args.bytes):
+            found.append(f'size {a["bytes"]} -> {b["bytes"]} B')
+        if None not in (a['ssim'], b['ssim']) and \
+                b['ssim'] < a['ssim'] - args.ssim:
+            found.append(f'SSIM {a["ssim"]:.4f} -> {b["ssim"]:.4f}')
+        if found:
+            regressions += 1
+            print(f'{" ".join(key)}: {", ".join(found)}')
+    missing = len(base.keys() ^ new.keys())
+    print(f'{regressions} regressions in {len(base.keys() & new.keys())} '
+          f'cases, {missing} cases not in both runs')
+    return 1 if regressions else 0
+
+
+def main():
+    data = common.package().data
+    parser = argparse.ArgumentParser(
+        description='Scaler × dither × stats-mode benchmark.')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    p = commands.add_parser('run', help='run the matrix')
+    p.add_argument('--out', required=True, metavar='FILE.json')
+    p.add_argument('--sources', metavar='DIR',
+                   default=os.path.join(tempfile.gettempdir(),
+                                        'imageflow-benchmark'),
+                   help='directory for the generated sources')
+    p.add_argument('--format', nargs='+', choices=('gif', 'webp'),
+                   default=['gif'])
+    p.add_argument('--kind', nargs='+', choices=SOURCES, default=[*SOURCES])
+    p.add_argument('--size', nargs='+', choices=SIZES, default=[*SIZES])
+    p.add_argument('--scaler', nargs='+', choices=data.scaler,
+                   default=data.scaler)
+    p.add_argument('--dither', nargs='+', choices=data.dither,
+                   default=data.dither)
+    p.add_argument('--stats-mode', nargs='+', choices=data.palette,
+                   default=data.palette)
+    p.add_argument('--optimize', nargs='+', choices=data.optimize,
+                   default=data.optimize)
+    p.add_argument('--duration', type=int, default=3, help='seconds')
+    p.add_argument('--fps', type=int, default=15)
+    p.add_argument('--width', type=int, default=640)
+    p.add_argument('--max-colors', type=int, default=256)
+    p.add_argument('--single-pass', action='store_true')
+    p.add_argument('--repeat', type=int, default=1,
+                   help='runs per case, the median time is kept')
+    p.set_defaults(func=run)
+
+    p = commands.add_parser('compare', help='regressions of a new run')
+    p.add_argument('base')
+    p.add_argument('new')
+    p.add_argument('--time', type=float, default=TIME)
+    p.add_argument('--rss', type=float, default=RSS)
+    p.add_argument('--bytes', type=float, default=BYTES)
+    p.add_argument('--ssim', type=float, default=SSIM)
+    p.set_defaults(func=compare)
+
+    args = parser.parse_args()
+    sys.exit(args.func(args))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+
+# palette_drift.py
+#
+# Copyright 2026 Golodnikov Sergey
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty
+# of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+
+# palette sampling against the full scan: palettegen time and the color
+# drift, for every color of the full palette the distance (CIE76 ΔE)
+# to the closest color of the sampled one
+#
+# python3 benchmarks/palette_drift.py clip.mp4 [clip.mp4 ...]
+
+import argparse
+import os
+import tempfile
+
+import common
+
+
+# (mode, value)
+VARIANTS = (
+    ('nth', 5),
+    ('nth', 10),
+    ('nth', 30),
+    ('scene', 10),
+    ('scene', 30),
+    ('budget', 200),
+    ('budget', 50),
+)
+
+
+def palette(source: str, options: dict, settings: dict, duration: int,
+            path: str):
+    imageflow = common.package()
+    args = imageflow.command.preparation(options, settings, '.gif', duration)
+    _stage, cmd = imageflow.command.generate(
+        ['-i', source], args, '.gif', path, path)[0]
+    return common.run(cmd)
+
+
+def drift(full: list, sampled: list):
+    full = [common.lab(c) for c in full]
+    sampled = [common.lab(c) for c in sampled]
+    distances = [min(common.delta_e(c, s) for s in sampled) for c in full]
+    return sum(distances) / len(distances), max(distances)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Palette sampling against the full scan.')
+    parser.add_argument('sources', nargs='+')
+    parser.add_argument('--fps', type=int, default=15)
+    parser.add_argument('--width', type=int, default=640)
+    args = parser.parse_args()
+
+    imageflow = common.package()
+    data = imageflow.data
+    options = dict(data.defaults, **{
+        'image-width': args.width, 'fps': args.fps})
+    settings = dict(data.defaults)
+
+    print(f'{"source":<24} {"sampling":<12} {"time, s":>8} '
+          f'{"speedup":>8} {"ΔE mean":>8} {"ΔE max":>8}')
+    with tempfile.TemporaryDirectory() as tmp:
+        for source in args.sources:
+            duration = imageflow.probe.info(source)['duration']
+            name = os.path.basename(source)[:24]
+
+            full = os.path.join(tmp, 'full.png')
+            settings['palette-sampling'] = 0
+            base = palette(source, options, settings, duration, full)
+            print(f'{name:<24} {"none":<12} {base:8.2f} {1:8.2f} '
+                  f'{0:8.2f} {0:8.2f}')
+            colors = common.palette_colors(full)
+
+            for mode, value in VARIANTS:
+                path = os.path.join(tmp, f'{mode}-{value}.png')
+                settings['palette-sampling'] = \
+                    data.palette_sampling.index(mode)
+                settings['palette-sampling-value'] = value
+                elapsed = palette(source, options, settings, duration, path)
+                mean, worst = drift(colors, common.palette_colors(path))
+                print(f'{name:<24} {f"{mode} {value}":<12} {elapsed:8.2f} '
+                      f'{base / elapsed:8.2f} {mean:8.2f} {worst:8.2f}')
+
+
+if __name__ == '__main__':
+    main()
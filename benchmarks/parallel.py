@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+
+# parallel.py
+#
+# Copyright 2026 Golodnikov Sergey
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty
+# of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+
+# the parallel (time-chunked) encoding against one process on the same
+# range: the outputs must have the same frames (count, duration, SSIM
+# against each other); the chunks are split at one frame rate and then
+# moved to another, like after the target size search; the exit status
+# is 1 if anything differs
+#
+# python3 benchmarks/parallel.py [clip.mp4 ...]
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import common
+import engines
+
+
+SSIM = 0.99
+
+# (name, frame rate of the split, frame rate of the output)
+RATES = (
+    ('same', 15, 15),
+    ('fit', 15, 12),
+)
+
+
+def clip(directory: str):
+    # 480p, 12 s, a keyframe every second
+    path = os.path.join(directory, 'clip.mkv')
+    common.run([
+        'ffmpeg', '-v', 'error', '-f', 'lavfi',
+        '-i', 'testsrc2=size=854x480:rate=30:duration=12',
+        '-c:v', 'libx264', '-g', '30', '-preset', 'ultrafast',
+        '-y', path,
+    ])
+    return path
+
+
+def duration(path: str):
+    out = common.child(
+        ['ffprobe', '-v', 'error', '-show_entries', 'format=duration',
+         '-of', 'csv=p=0', path],
+        collect=True,
+    ).output.decode()
+    return float(out.strip())
+
+
+def convert(imageflow, source: str, meta: dict, args: tuple,
+            file_format: str, spans: list, directory: str):
+    job = imageflow.jobs.Job(
+        directory, source, ['-i', source], args, file_format,
+        (meta['width'], meta['height']), meta['duration'], spans=spans,
+    )
+    began = time.monotonic()
+    if not job.run():
+        raise RuntimeError(f'{job.stage} error: {job.error}')
+    return time.monotonic() - began, job
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Output equivalence of the parallel encoding.')
+    parser.add_argument('sources', nargs='*')
+    parser.add_argument('--chunks', type=int, default=4)
+    parser.add_argument('--width', type=int, default=480)
+    parser.add_argument('--ssim', type=float, default=SSIM)
+    args = parser.parse_args()
+
+    imageflow = common.package()
+    command, data, parallel, probe = (
+        imageflow.command, imageflow.data, imageflow.parallel,
+        imageflow.probe)
+
+    differences = 0
+    with tempfile.TemporaryDirectory() as tmp:
+        for source in args.sources or [clip(tmp)]:
+            name = os.path.basename(source)
+            meta = probe.info(source)
+            keyframes = probe.keyframes(source)[0]
+            for file_format in imageflow.parallel.FORMATS:
+                for label, split, fps in RATES:
+                    options = dict(data.defaults, **{
+                        'image-width': args.width, 'fps': fps,
+                        'ratio': True})
+                    cmd_args = command.preparation(
+                        options, dict(data.defaults), file_format)
+                    spans = parallel.spans(
+                        0, meta['duration'], keyframes, args.chunks, split)
+                    spans = parallel.regrid(
+                        spans, command.frame_rate(cmd_args))
+                    results = [convert(
+                        imageflow, source, meta, cmd_args, file_format, s,
+                        tmp) for s in ((), spans)]
+                    (t1, a), (t2, b) = results
+                    fa, fb = engines.frames(a.result), engines.frames(b.result)
+                    da, db = duration(a.result), duration(b.result)
+                    value = engines.ssim(a.result, b.result)
+                    same = fa == fb and abs(da - db) < 1 / fps and \
+                        value is not None and value >= args.ssim
+                    differences += not same
+                    print(f'{name} {file_format} {label}: '
+                          f'one {t1:.2f} s, {len(spans)} chunks {t2:.2f} s, '
+                          f'frames {fa[0]}/{fb[0]}, '
+                          f'duration {da:.2f}/{db:.2f} s, '
+                          f'SSIM {value}{"" if same else " DIFFERENT"}')
+                    for _, job in results:
+                        job.cleanup()
+    print(f'{differences} differences')
+    return 1 if differences else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+
+# quantize.py
+#
+# Copyright 2026 Golodnikov Sergey
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty
+# of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+
+# palettegen against the NumPy palette at several pixel budgets: wall time
+# of the palette and the color error (CIE76 ΔE, mean and 99th percentile)
+# of the source frames mapped to the nearest palette color without
+# dithering; the exit status is 2 without NumPy
+#
+# python3 benchmarks/quantize.py [clip.mp4] [--budget 50 250 1000]
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import common
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+REFERENCE = 30  # frames spread over the source for the error
+
+
+def clip(directory: str):
+    # 1080p, 30 s of a slowly changing gradient
+    path = os.path.join(directory, 'clip.mkv')
+    common.run([
+        'ffmpeg', '-v', 'error', '-f', 'lavfi',
+        '-i', 'mandelbrot=size=1920x1080:rate=30',
+        '-t', '30', '-c:v', 'libx264', '-preset', 'ultrafast',
+        '-y', path,
+    ])
+    return path
+
+
+def rgb(cmd: list):
+    # rawvideo rgb24 of an ffmpeg command as (n, 3) pixels
+    output = common.child(cmd, collect=True).output
+    pixels = numpy.frombuffer(output, dtype=numpy.uint8)
+    return pixels[:len(pixels) // 3 * 3].reshape(-1, 3)
+
+
+def reference(source: str, args: tuple, duration: int):
+    # every Nth frame after the filters of the conversion
+    frames = duration / 1000000 * common.package().command.frame_rate(args)
+    step = max(1, round(frames / REFERENCE))
+    return rgb([
+        'ffmpeg', '-v', 'error', '-i', source, '-an',
+        '-vf', f"{args[0]},select='not(mod(n\\,{step}))',format=rgb24",
+        '-f', 'rawvideo', '-vsync', '0', '-',
+    ])
+
+
+def colors(path: str):
+    # opaque entries of a palette image
+    output = common.child(
+        ['ffmpeg', '-v', 'error', '-i', path, '-f', 'rawvideo',
+         '-pix_fmt', 'rgba', '-'], collect=True).output
+    entries = numpy.frombuffer(output, dtype=numpy.uint8).reshape(-1, 4)
+    return numpy.unique(entries[entries[:, 3] == 255][:, :3], axis=0)
+
+
+def lab(pixels):
+    # sRGB (D65) to CIE Lab
+    c = pixels.astype(numpy.float64) / 255
+    c = numpy.where(c > 0.04045, ((c + 0.055) / 1.055) ** 2.4, c / 12.92)
+    xyz = c @ numpy.array([
+        [0.4124, 0.2126, 0.0193],
+        [0.3576, 0.7152, 0.1192],
+        [0.1805, 0.0722, 0.9505],
+    ]) / numpy.array([0.95047, 1.0, 1.08883])
+    f = numpy.where(xyz > 216 / 24389, numpy.cbrt(xyz),
+                    (24389 / 27 * xyz + 16) / 116)
+    return numpy.stack((
+        116 * f[:, 1] - 16,
+        500 * (f[:, 0] - f[:, 1]),
+        200 * (f[:, 1] - f[:, 2]),
+    ), axis=1)
+
+
+def error(pixels, palette):
+    # ΔE of every pixel to the nearest palette color (in RGB, like
+    # paletteuse), mean and 99th percentile
+    quantize = common.package().quantize
+    index = quantize.nearest(
+        pixels.astype(numpy.float32), palette.astype(numpy.float32))
+    delta = numpy.linalg.norm(lab(pixels) - lab(palette[index]), axis=1)
+    return float(delta.mean()), float(numpy.percentile(delta, 99))
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='palettegen against the NumPy palette.')
+    parser.add_argument('source', nargs='?')
+    parser.add_argument('--budget', type=int, nargs='+',
+                        default=[50, 250, 1000], help='thousands of pixels')
+    parser.add_argument('--fps', type=int, default=15)
+    parser.add_argument('--width', type=int, default=640)
+    args = parser.parse_args()
+
+    if numpy is None:
+        print('NumPy is not installed', file=sys.stderr)
+        return 2
+    imageflow = common.package()
+    command, data, quantize = \
+        imageflow.command, imageflow.data, imageflow.quantize
+    options = dict(data.defaults, **{
+        'image-width': args.width, 'fps': args.fps, 'ratio': True})
+
+    with tempfile.TemporaryDirectory() as tmp:
+        source = args.source or clip(tmp)
+        meta = imageflow.probe.info(source)
+        duration = meta['duration']
+        size = (args.width,
+                round(args.width * meta['height'] / meta['width'] / 2) * 2)
+        cmd_args = command.preparation(
+            options, dict(data.defaults), '.gif', duration)
+        pixels = reference(source, cmd_args, duration)
+
+        path = os.path.join(tmp, 'palettegen.png')
+        _stage, cmd = command.generate(
+            ['-i', source], cmd_args, '.gif',
+            os.path.join(tmp, 'result.gif'), path)[0]
+        elapsed = common.run(cmd)
+        mean, high = error(pixels, colors(path))
+        print(f'{"palettegen":>12}: {elapsed:7.2f} s, '
+              f'ΔE {mean:5.2f} mean, {high:5.2f} p99')
+
+        for budget in args.budget:
+            path = os.path.join(tmp, f'numpy-{budget}.png')
+            began = time.monotonic()
+            output = common.child(quantize.pipe(
+                ['-i', source], cmd_args, size, duration, budget * 1000),
+                collect=True).output
+            sampled = quantize.palette(output, cmd_args, budget * 1000, path)
+            elapsed = time.monotonic() - began
+            mean, high = error(pixels, colors(path))
+            print(f'{budget:>8}k px: {elapsed:7.2f} s, '
+                  f'ΔE {mean:5.2f} mean, {high:5.2f} p99, '
+                  f'{sampled} pixels sampled')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+
+# segments.py
+#
+# Copyright 2026 Golodnikov Sergey
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty
+# of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+
+# a segment list in one pass against one job per segment: wall time and
+# decoded length; the segments are spread evenly over the source, without
+# arguments a synthetic 2 minute clip is used
+#
+# python3 benchmarks/segments.py [clip.mp4] [--count 10] [--length 4]
+
+import argparse
+import os
+import tempfile
+
+import common
+
+
+def clip(directory: str):
+    # 720p, a keyframe every 2 s
+    path = os.path.join(directory, 'clip.mkv')
+    common.run([
+        'ffmpeg', '-v', 'error', '-f', 'lavfi',
+        '-i', 'testsrc2=size=1280x720:rate=30:duration=120',
+        '-c:v', 'libx264', '-g', '60', '-preset', 'ultrafast',
+        '-y', path,
+    ])
+    return path
+
+
+def separate(imageflow, source: str, segments: list, duration: int,
+             keyframes: list, args: list, file_format: str,
+             directory: str):
+    elapsed = 0.0
+    for i, (start, end) in enumerate(segments):
+        src, trim = imageflow.command.seek(
+            source, start, end, duration, keyframes)
+        for _stage, cmd in imageflow.command.generate(
+                src, args[i], file_format,
+                os.path.join(directory, f'separate_{i}{file_format}'),
+                os.path.join(directory, f'palette_{i}.png'), trim=trim):
+            elapsed += common.run(cmd)
+    return elapsed
+
+
+def one_pass(imageflow, source: str, segments: list, keyframes: list,
+             args: list, file_format: str, size: tuple, directory: str):
+    src, renditions, lengths = imageflow.segment.prepare(
+        source, segments, args, file_format, size, keyframes)
+    results = [os.path.join(directory, f'one{r["suffix"]}{file_format}')
+               for r in renditions]
+    palettes = [os.path.join(directory, f'one{r["suffix"]}.png')
+                for r in renditions]
+    elapsed = 0.0
+    for _stage, cmd in imageflow.rendition.generate(
+            src, renditions, results, palettes):
+        elapsed += common.run(cmd)
+    return elapsed, sum(lengths), len(lengths)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Segment list in one pass against separate jobs.')
+    parser.add_argument('source', nargs='?')
+    parser.add_argument('--format', choices=('gif', 'webp'), default='gif')
+    parser.add_argument('--count', type=int, default=10)
+    parser.add_argument('--length', type=float, default=4, help='seconds')
+    parser.add_argument('--fps', type=int, default=15)
+    parser.add_argument('--width', type=int, default=480)
+    args = parser.parse_args()
+
+    imageflow = common.package()
+    data = imageflow.data
+    file_format = '.' + args.format
+    options = dict(data.defaults, **{
+        'image-width': args.width, 'fps': args.fps, 'ratio': True})
+    settings = dict(data.defaults)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        source = args.source or clip(tmp)
+        meta = imageflow.probe.info(source)
+        duration = meta['duration']
+        keyframes, _ = imageflow.probe.keyframes(source, meta['start'])
+        length = round(args.length * 1000000)
+        step = duration // args.count
+        segments = [(i * step, min(duration, i * step + length))
+                    for i in range(args.count)]
+        size = (args.width,
+                round(args.width * meta['height'] / meta['width'] / 2) * 2)
+        # every segment with its own length, like the application
+        cmd_args = [imageflow.command.preparation(
+            options, settings, file_format, end - start)
+            for start, end in segments]
+
+        t_separate = separate(
+            imageflow, source, segments, duration, keyframes, cmd_args,
+            file_format, tmp)
+        t_one, decoded, inputs = one_pass(
+            imageflow, source, segments, keyframes, cmd_args, file_format,
+            size, tmp)
+        decoded_separate = imageflow.segment.separate(segments, keyframes)
+
+    print(f'{args.count} segments of {args.length:g} s, {inputs} inputs')
+    print(f'separate: {t_separate:8.2f} s, '
+          f'{decoded_separate / 1000000:.1f} s decoded per pass')
+    print(f'one pass: {t_one:8.2f} s, '
+          f'{decoded / 1000000:.1f} s decoded per pass')
+    if t_separate > 0:
+        print(f'saved:    {t_separate - t_one:8.2f} s '
+              f'({1 - t_one / t_separate:.1%})')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,222 @@
+# animation.py
+#
+# Copyright 2026 Golodnikov Sergey
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty
+# of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+
+# frames of the results for the preview player: the size and the frame
+# delays are read from the file headers, the frames are decoded by ffmpeg
+# (RGBA over a pipe) a few at a time ahead of the playback and kept in
+# a cache with a memory limit; must not import Gtk/Adw, see player.py
+
+from collections import OrderedDict
+import struct
+import threading
+
+from . import cache, child
+
+
+MEMORY_LIMIT = 256 * cache.MB  # decoded frames
+# these and shorter delays are shown as 100 ms, like the browsers do
+MIN_DELAY = 10
+DEFAULT_DELAY = 100
+
+
+class AnimationError(Exception):
+    pass
+
+
+def delay(value: int):
+    # milliseconds
+    return DEFAULT_DELAY if value <= MIN_DELAY else value
+
+
+def gif_blocks(data: bytes, offset: int):
+    # offset after a chain of sub-blocks
+    while data[offset]:
+        offset += data[offset] + 1
+    return offset + 1
+
+
+def gif(data: bytes):
+    width, height, flags = struct.unpack_from('<HHB', data, 6)
+    offset = 13
+    if flags & 0x80:
+        offset += 3 << ((flags & 7) + 1)
+    delays, value = [], 0
+    while offset < len(data) and data[offset] != 0x3B:
+        block = data[offset]
+        if block == 0x21:
+            if data[offset + 1] == 0xF9:
+                # graphic control extension, in 1/100 s
+                value = struct.unpack_from('<H', data, offset + 4)[0] * 10
+            offset = gif_blocks(data, offset + 2)
+        elif block == 0x2C:
+            flags = data[offset + 9]
+            offset += 10
+            if flags & 0x80:
+                offset += 3 << ((flags & 7) + 1)
+            # LZW minimum code size, then the image data
+            offset = gif_blocks(data, offset + 1)
+            delays.append(delay(value))
+            value = 0
+        else:
+            raise AnimationError(f'unknown GIF block {block:#x}')
+    return width, height, delays
+
+
+def webp(data: bytes):
+    width = height = None
+    delays = []
+    offset = 12
+    while offset + 8 <= len(data):
+        kind = data[offset:offset + 4]
+        size = struct.unpack_from('<I', data, offset + 4)[0]
+        body = offset + 8
+        if kind == b'VP8X':
+            width = int.from_bytes(data[body + 4:body + 7], 'little') + 1
+            height = int.from_bytes(data[body + 7:body + 10], 'little') + 1
+        elif kind == b'ANMF':
+            delays.append(delay(
+                int.from_bytes(data[body + 12:body + 15], 'little')))
+        elif kind == b'VP8L' and width is None:
+            bits = int.from_bytes(data[body + 1:body + 5], 'little')
+            width, height = (bits & 0x3FFF) + 1, ((bits >> 14) & 0x3FFF) + 1
+        elif kind == b'VP8 ' and width is None:
+            w, h = struct.unpack_from('<HH', data, body + 6)
+            width, height = w & 0x3FFF, h & 0x3FFF
+        offset = body + size + (size & 1)
+    if width is None:
+        raise AnimationError('no WebP image')
+    # a still image
+    return width, height, delays or [0]
+
+
+def scan(path: str):
+    # (width, height, delays in milliseconds)
+    with open(path, 'rb') as f:
+        data = f.read()
+    try:
+        if data[:6] in (b'GIF87a', b'GIF89a'):
+            return gif(data)
+        if data[:4] == b'RIFF' and data[8:12] == b'WEBP':
+            return webp(data)
+    except (IndexError, struct.error) as err:
+        raise AnimationError(f'damaged file: {err}') from None
+    raise AnimationError('not a GIF or WebP file')
+
+
+class Frames:
+    # index: (frame, bytes), the least recently used go first
+    def __init__(self, limit=MEMORY_LIMIT):
+        self.limit = limit
+        self.size = 0
+        self.items = OrderedDict()
+
+    def get(self, index: int):
+        found = self.items.get(index)
+        if found is None:
+            return None
+        self.items.move_to_end(index)
+        return found[0]
+
+    def put(self, index: int, frame, size: int):
+        old = self.items.pop(index, None)
+        if old is not None:
+            self.size -= old[1]
+        self.items[index] = (frame, size)
+        self.size += size
+        # the newest one stays even above the limit
+        while self.size > self.limit and len(self.items) > 1:
+            self.size -= self.items.popitem(last=False)[1][1]
+
+    def clear(self):
+        self.items.clear()
+        self.size = 0
+
+
+class Decoder:
+    # frames from the first one in order, at most ahead of them past the
+    # playback position; callbacks from the decoder thread:
+    # frame(decoder, index, data), finished(decoder, error)
+    def __init__(self, path: str, width: int, height: int, first: int,
+                 ahead: int, frame, finished):
+        self.width, self.height = width, height
+        self.first = first
+        self.next = first  # index of the next decoded frame
+        self.position = first  # playback
+        self.ahead = max(1, ahead)
+        self.callbacks = (frame, finished)
+        self.done = False
+        self.stopped = False
+        self.condition = threading.Condition()
+        select = f"select='gte(n\\,{first})'," if first else ''
+        self.cmd = [
+            'ffmpeg', '-v', 'error', '-i', path, '-an',
+            '-vf', f'{select}scale={width}:{height},format=rgba',
+            '-f', 'rawvideo', '-vsync', '0', '-',
+        ]
+        self.process = None
+        threading.Thread(target=self.run, daemon=True).start()
+
+    def seek(self, index: int):
+        with self.condition:
+            self.position = index
+            self.condition.notify()
+
+    def stop(self):
+        with self.condition:
+            self.stopped = True
+            self.condition.notify()
+            if self.process is not None:
+                self.process.terminate()
+
+    def run(self):
+        frame, finished = self.callbacks
+        size = self.width * self.height * 4
+        with self.condition:
+            if self.stopped:
+                return
+            try:
+                # stdout is read here, the errors are short (-v error)
+                self.process = child.Child(self.cmd, collect=True)
+            except OSError as err:
+                self.done = True
+                finished(self, str(err))
+                return
+        output = self.process.process.stdout
+        while True:
+            with self.condition:
+                while not self.stopped and \
+                        self.next - self.position >= self.ahead:
+                    self.condition.wait()
+                if self.stopped:
+                    break
+            data = output.read(size)
+            if len(data) < size:
+                break
+            frame(self, self.next, data)
+            self.next += 1
+        self.process.terminate()
+        self.process.wait()
+        self.done = True
+        if self.stopped:
+            return
+        error = None
+        if self.process.returncode != 0 or self.next == self.first:
+            error = self.process.error or 'no frames decoded'
+        finished(self, error)
@@ -0,0 +1,420 @@
+# backend.py
+#
+# Copyright 2026 Golodnikov Sergey
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty
+# of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+
+# conversion engines behind the source analysis and the generation:
+# ffmpeg/ffprobe child processes or PyAV (libavformat, libavcodec and
+# libavfilter in the application process); both take the filters made by
+# command.preparation(), the commands of command.generate() are used by
+# the processes only; must not import Gtk/Adw
+
+from collections import OrderedDict
+from fractions import Fraction
+import threading
+import time
+
+from . import cache, probe
+
+try:
+    import av
+except ImportError:
+    av = None
+
+
+OPEN_LIMIT = 4  # input files kept open by PyAV
+
+
+class Subprocess:
+    name = 'ffmpeg'
+
+    def info(self, path: str, usages=None):
+        return probe.info(path, usages)
+
+    def keyframes(self, path: str, start=0, usages=None):
+        return probe.keyframes(path, start, usages)
+
+    def generate(self, job, cached: bool, store: bool, progress):
+        # cached: the palette file exists; store: write it
+        steps = job.steps(cached, store)
+        for index, (stage, commands) in enumerate(steps):
+            if job.cancelled:
+                return False
+            job.stage = stage
+            if not job.execute(commands, index, len(steps), progress):
+                return False
+        return True
+
+
+# --------------------------------------------------------------------------
+# PyAV
+
+
+def token(text: str, i: int, ends: str):
+    # av_get_token(): up to one of the ends, quotes and escapes removed
+    out = []
+    while i < len(text) and text[i] not in ends:
+        c = text[i]
+        if c == '\\' and i + 1 < len(text):
+            out.append(text[i + 1])
+            i += 2
+        elif c == "'":
+            end = text.find("'", i + 1)
+            end = len(text) if end < 0 else end
+            out.append(text[i + 1:end])
+            i = end + 1
+        else:
+            out.append(c)
+            i += 1
+    return ''.join(out).strip(), i
+
+
+def chain(text: str):
+    # "fps=15,scale=640:-1" as [(name, args)], args is None without "="
+    filters, i = [], 0
+    while i < len(text):
+        name, i = token(text, i, '=,')
+        args = None
+        if i < len(text) and text[i] == '=':
+            args, i = token(text, i + 1, ',')
+        filters.append((name, args))
+        i += 1
+    return filters
+
+
+def source(src: list):
+    # the input options of command.seek(): (path, seek, length, accurate),
+    # seconds, None for anything else (several inputs, other options)
+    path, values, accurate = None, {}, True
+    i = 0
+    while i < len(src):
+        if src[i] == '-noaccurate_seek':
+            accurate = False
+            i += 1
+            continue
+        if i + 1 >= len(src) or src[i] not in ('-ss', '-t', '-to', '-i'):
+            return None
+        if src[i] == '-i':
+            if path is not None:
+                return None
+            path = src[i + 1]
+        else:
+            values[src[i]] = float(src[i + 1])
+        i += 2
+    if path is None:
+        return None
+    seek = values.get('-ss', 0.0)
+    length = values.get('-t')
+    if length is None and '-to' in values:
+        length = values['-to'] - seek
+    return path, seek, length, accurate
+
+
+def output(cuatro: list):
+    # encoder, encoder options and muxer options from the output
+    # arguments of command.preparation()
+    codec, options, muxer = 'gif', {}, {}
+    i = 0
+    while i < len(cuatro):
+        key = cuatro[i]
+        if key == '-y':
+            i += 1
+            continue
+        value = cuatro[i + 1]
+        i += 2
+        match key:
+            case '-c:v':
+                codec = value
+            case '-q:v':
+                # global_quality, libwebp takes it as the quality
+                options['quality'] = value
+            case '-loop':
+                muxer['loop'] = value
+            case '-vsync':
+                pass  # the timestamps are kept as they are
+            case _:
+                options[key[1:]] = value
+    return codec, options, muxer
+
+
+class PyAV(Subprocess):
+    # one input, GIF or WebP, without chunks; the rest goes to ffmpeg
+    name = 'pyav'
+
+    def __init__(self):
+        self.inputs = OrderedDict()  # fingerprint: (container, lock)
+        self.lock = threading.Lock()
+
+    def open(self, path: str):
+        # (container, lock), the containers stay open between the probe,
+        # the index and the encoding; a busy one is not shared
+        key = cache.fingerprint(path)
+        with self.lock:
+            found = self.inputs.get(key)
+            if found is not None and found[1].acquire(blocking=False):
+                self.inputs.move_to_end(key)
+                return found
+            container, lock = av.open(path), threading.Lock()
+            lock.acquire()
+            if found is None:
+                self.inputs[key] = (container, lock)
+                while len(self.inputs) > OPEN_LIMIT:
+                    old, old_lock = self.inputs.popitem(last=False)[1]
+                    if old_lock.acquire(blocking=False):
+                        old.close()
+                        old_lock.release()
+            return container, lock
+
+    def release(self, container, lock):
+        lock.release()
+        with self.lock:
+            if all(c is not container for c, _ in self.inputs.values()):
+                container.close()
+
+    def info(self, path: str, usages=None):
+        try:
+            container, lock = self.open(path)
+        except (OSError, av.error.FFmpegError) as err:
+            raise probe.ProbeError(str(err))
+        try:
+            if not container.streams.video:
+                raise probe.ProbeError('No video stream')
+            stream = container.streams.video[0]
+            rate = stream.average_rate
+            return {
+                'duration': container.duration or 0,  # AV_TIME_BASE
+                'start': container.start_time or 0,
+                'width': stream.codec_context.width,
+                'height': stream.codec_context.height,
+                'fps': float(rate) if rate else 0.0,
+                'codec': stream.codec_context.name,
+                'frames': stream.frames,
+            }
+        finally:
+            self.release(container, lock)
+
+    def keyframes(self, path: str, start=0, usages=None):
+        try:
+            container, lock = self.open(path)
+        except (OSError, av.error.FFmpegError) as err:
+            raise probe.ProbeError(str(err))
+        positions, packets = [], 0
+        try:
+            container.seek(0)
+            stream = container.streams.video[0]
+            for packet in container.demux(stream):
+                if packet.size == 0:
+                    continue  # flush
+                packets += 1
+                if packet.is_keyframe and packet.pts is not None:
+                    positions.append(round(
+                        packet.pts * packet.time_base * 1000000) - start)
+        except av.error.FFmpegError as err:
+            raise probe.ProbeError(str(err))
+        finally:
+            self.release(container, lock)
+        return sorted(positions), packets
+
+    def supports(self, job):
+        return av is not None and len(job.spans) <= 1 and \
+            len(job.outputs()) == 1 and source(job.src) is not None
+
+    def generate(self, job, cached: bool, store: bool, progress):
+        if not self.supports(job):
+            return super().generate(job, cached, store, progress)
+        uno, dos, tres, cuatro = job.args
+        if job.trim:
+            uno = f'{job.trim},{uno}'
+            dos = dos and f'{job.trim},{dos}'
+        count = 2 if job.file_format == '.gif' and not cached else 1
+        try:
+            palette = None
+            if job.file_format == '.gif':
+                if cached:
+                    palette = self.palette_read(job.palette)
+                else:
+                    job.stage = 'palette'
+                    with job.timings.measure('palette'):
+                        palette = self.decode(job, dos, None, 0, count,
+                                              progress)
+                    if palette is None:
+                        return False
+                    if store:
+                        self.palette_write(palette, job.palette)
+            job.stage = 'generation'
+            with job.timings.measure('generation'):
+                return self.decode(job, uno, (tres, palette, cuatro),
+                                   count - 1, count, progress) is not None
+        except (OSError, ValueError, av.error.FFmpegError) as err:
+            job.error = str(err)
+            return False
+
+    def graph(self, stream, filters: str, paletteuse, palette):
+        # buffer -> filters [-> paletteuse <- palette] -> buffersink
+        graph = av.filter.Graph()
+        buffer = last = graph.add_buffer(template=stream)
+        for name, args in chain(filters):
+            node = graph.add(name, args) if args is not None \
+                else graph.add(name)
+            last.link_to(node)
+            last = node
+        inputs = None
+        if paletteuse is not None:
+            node = graph.add('paletteuse', chain(paletteuse)[0][1])
+            colors = graph.add_buffer(
+                width=palette.width, height=palette.height,
+                format=palette.format.name, time_base=Fraction(1, 1))
+            last.link_to(node, 0, 0)
+            colors.link_to(node, 0, 1)
+            last, inputs = node, colors
+        sink = graph.add('buffersink')
+        last.link_to(sink)
+        graph.configure()
+        if inputs is not None:
+            palette.pts = 0
+            inputs.push(palette)
+            inputs.push(None)
+        return graph, buffer, sink
+
+    def decode(self, job, filters: str, encode, index: int, count: int,
+               progress):
+        # encode: None for palettegen (the palette frame is returned),
+        # (paletteuse or None, palette, output arguments) for the result;
+        # None if cancelled
+        path, seek, length, accurate = source(job.src)
+        container, lock = self.open(path)
+        try:
+            stream = container.streams.video[0]
+            if not stream.codec_context.is_open:
+                stream.thread_type = 'AUTO'
+            offset = (container.start_time or 0) / 1000000 + seek
+            container.seek(round(offset * 1000000), backward=True)
+            paletteuse, palette = None, None
+            if encode is not None and job.file_format == '.gif':
+                paletteuse, palette = encode[0], encode[1]
+            elif encode is not None:
+                # the pixel format ffmpeg negotiates for libwebp
+                filters += ',format=yuv420p'
+            # the graph must outlive its filters
+            graph, buffer, sink = self.graph(
+                stream, filters, paletteuse, palette)
+            writer = Writer(job, encode[2]) if encode is not None else None
+            result, frames, started = None, 0, time.monotonic()
+
+            def pull():
+                nonlocal result
+                while True:
+                    try:
+                        frame = sink.pull()
+                    except (av.error.BlockingIOError, av.error.EOFError):
+                        return
+                    if writer is None:
+                        result = frame  # palettegen gives one at the end
+                    else:
+                        writer.write(frame)
+
+            for frame in container.decode(stream):
+                if job.cancelled:
+                    return None
+                if frame.pts is None:
+                    continue
+                position = float(frame.pts * stream.time_base) - offset
+                if accurate and position < 0:
+                    continue
+                if length is not None and position >= length:
+                    break
+                frame.pts = round(position / stream.time_base)
+                buffer.push(frame)
+                pull()
+                frames += 1
+                elapsed = time.monotonic() - started
+                with job.lock:
+                    job.speed = frames / elapsed if elapsed > 0 else 0.0
+                    fraction = 0.0
+                    if job.duration > 0:
+                        fraction = min(1.0, position * 1000000 / job.duration)
+                    job.progress_update((index + fraction) / count)
+                if progress is not None:
+                    progress(job)
+            buffer.push(None)
+            pull()
+            if writer is None:
+                return result
+            job.frames = writer.close()
+            return job.result
+        finally:
+            self.release(container, lock)
+
+    def palette_read(self, path: str):
+        with av.open(path) as container:
+            return next(container.decode(video=0))
+
+    def palette_write(self, frame, path: str):
+        with av.open(path, 'w', format='image2') as container:
+            stream = container.add_stream('png')
+            stream.width, stream.height = frame.width, frame.height
+            stream.pix_fmt = 'rgba'
+            frame = frame.reformat(format='rgba')
+            for packet in stream.encode(frame):
+                container.mux(packet)
+            for packet in stream.encode(None):
+                container.mux(packet)
+
+
+class Writer:
+    # the output file, opened with the first frame (size, time base)
+    def __init__(self, job, cuatro: list):
+        self.path = job.result
+        self.file_format = job.file_format
+        self.codec, self.options, self.muxer = output(cuatro)
+        self.container = None
+        self.stream = None
+        self.frames = 0
+
+    def write(self, frame):
+        if self.container is None:
+            self.container = av.open(
+                self.path, 'w', format=self.file_format[1:],
+                container_options=self.muxer)
+            self.stream = self.container.add_stream(self.codec)
+            self.stream.width, self.stream.height = frame.width, frame.height
+            self.stream.pix_fmt = frame.format.name
+            self.stream.codec_context.time_base = frame.time_base
+            self.stream.options = self.options
+        for packet in self.stream.encode(frame):
+            self.container.mux(packet)
+        self.frames += 1
+
+    def close(self):
+        if self.container is None:
+            raise ValueError('No frames in the range')
+        for packet in self.stream.encode(None):
+            self.container.mux(packet)
+        self.container.close()
+        return self.frames
+
+
+SUBPROCESS = Subprocess()
+PYAV = PyAV() if av is not None else None
+
+
+def get(name: str):
+    # PyAV if it is selected and installed
+    if name == 'pyav' and PYAV is not None:
+        return PYAV
+    return SUBPROCESS
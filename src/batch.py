@@ -0,0 +1,245 @@
+# batch.py
+#
+# Copyright 2026 Golodnikov Sergey
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty
+# of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+
+# headless conversion, without Gtk/Adw:
+# imageflow --batch in/*.mp4 --out dir --format gif --fps 15 --width 640
+# imageflow --batch in/*.mp4 --renditions "gif:480p gif:720p webp:1080p"
+
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import argparse
+import os
+import sys
+import time
+
+from . import backend, command, data, jobs, parallel, probe, rendition
+
+
+def arguments(argv):
+    parser = argparse.ArgumentParser(
+        prog='imageflow',
+        description='Convert video files to animated images.',
+    )
+    parser.add_argument('--batch', nargs='+', metavar='FILE', required=True,
+                        help='source video files')
+    parser.add_argument('--out', default='.', metavar='DIR',
+                        help='output directory')
+    parser.add_argument('--format', choices=('gif', 'webp'), default='gif')
+    parser.add_argument('--fps', type=int, default=data.defaults['fps'])
+    parser.add_argument('--width', type=int,
+                        default=data.defaults['image-width'])
+    parser.add_argument('--height', type=int,
+                        help='output height, the aspect ratio is kept '
+                             'if not set')
+    parser.add_argument('--scaler', choices=data.scaler,
+                        default=data.scaler[data.defaults['scaler']])
+    parser.add_argument('--dither', choices=data.dither,
+                        default=data.dither[data.defaults['dither']])
+    parser.add_argument('--max-colors', type=int,
+                        default=data.defaults['max-colors'])
+    parser.add_argument('--stats-mode', choices=data.palette,
+                        default=data.palette[data.defaults['stats-mode']])
+    parser.add_argument('--single-pass', action='store_true')
+    parser.add_argument('--decimate', type=int, nargs='?', const=5,
+                        metavar='THRESHOLD',
+                        help='drop duplicate frames, the previous frame '
+                             'is shown longer')
+    parser.add_argument('--palette-budget', type=int,
+                        default=data.defaults['palette-budget'],
+                        metavar='KPIXELS',
+                        help='GIF palette made with NumPy from this many '
+                             'thousands of sampled pixels, 0: palettegen')
+    parser.add_argument('--engine', choices=data.engine,
+                        default=data.engine[data.defaults['engine']],
+                        help='pyav: decoding and encoding in the worker '
+                             'processes, if PyAV is installed')
+    parser.add_argument('--jobs', type=int, default=os.cpu_count() or 1,
+                        help='number of parallel conversions')
+    parser.add_argument('--chunks', type=int, default=1,
+                        help='split every GIF into time chunks encoded '
+                             'in parallel')
+    parser.add_argument('--renditions', metavar='SET',
+                        help='several outputs from one decode, e.g. '
+                             '"gif:480p gif:720p@12 webp:1080p:q=80", '
+                             'the other options are the defaults')
+    args = parser.parse_args(argv)
+    args.entries = []
+    if args.renditions:
+        try:
+            args.entries = rendition.parse(args.renditions)
+        except ValueError as err:
+            parser.error(str(err))
+        if args.chunks > 1:
+            parser.error('--chunks cannot be used with --renditions')
+    return args
+
+
+def parameters(args):
+    options = {
+        'image-width': args.width,
+        'image-height': args.height or data.defaults['image-height'],
+        'scaler': data.scaler.index(args.scaler),
+        'ratio': args.height is None,
+        'fps': args.fps,
+        'max-colors': args.max_colors,
+        'dither': data.dither.index(args.dither),
+    }
+    settings = dict(data.defaults)
+    settings['stats-mode'] = data.palette.index(args.stats_mode)
+    settings['single-pass'] = args.single_pass
+    settings['engine'] = data.engine.index(args.engine)
+    settings['palette-budget'] = args.palette_budget
+    if args.decimate is not None:
+        settings['decimate'] = True
+        settings['decimate-threshold'] = args.decimate
+    return options, settings
+
+
+def convert(source: str, result: str, options: dict, settings: dict,
+            file_format: str, chunks=1, entries=()):
+    # runs in a worker process, the error and the written files
+    if entries:
+        return convert_set(source, result, options, settings, entries)
+    args = command.preparation(options, settings, file_format)
+    size = (options['image-width'], options['image-height'])
+    budget = settings['palette-budget'] * 1000
+    duration, spans = 0, ()
+    if file_format not in parallel.FORMATS:
+        chunks = 1
+    # the pixel budget is spread over the frames
+    if chunks > 1 or budget and file_format == '.gif':
+        try:
+            duration = probe.info(source)['duration']
+            if chunks > 1:
+                positions, _ = probe.keyframes(source)
+                spans = parallel.spans(
+                    0, duration, positions, chunks, options['fps'])
+        except probe.ProbeError as err:
+            return f'analysis error: {err}', []
+    # the workspace is on the same file system as the result
+    job = jobs.Job(
+        os.path.dirname(os.path.abspath(result)), source, ['-i', source],
+        args, file_format, size, duration,
+        single_pass=settings['single-pass'], spans=spans,
+        engine=backend.get(data.engine[settings['engine']]),
+        budget=budget,
+    )
+    try:
+        if not job.run():
+            return f'{job.stage} error: {job.error}', []
+        os.replace(job.result, result)
+    finally:
+        job.cleanup()
+    return None, [result]
+
+
+def convert_set(source: str, result: str, options: dict, settings: dict,
+                entries: list):
+    # the result path gives the directory, the names have the suffixes
+    try:
+        meta = probe.info(source)
+    except probe.ProbeError as err:
+        return f'analysis error: {err}', []
+    if not meta['width'] or not meta['height']:
+        return 'analysis error: no video size', []
+    renditions = rendition.prepare(
+        entries, options, settings, (meta['width'], meta['height']))
+    directory = os.path.dirname(os.path.abspath(result))
+    job = jobs.Renditions(
+        directory, source, ['-i', source], renditions, meta['duration'],
+        single_pass=settings['single-pass'],
+    )
+    files = []
+    try:
+        if not job.run():
+            return f'{job.stage} error: {job.error}', []
+        for file, name, _ in job.outputs():
+            files.append(os.path.join(os.path.dirname(result), name))
+            os.replace(file, files[-1])
+    finally:
+        job.cleanup()
+    return None, files
+
+
+def main(argv):
+    args = arguments(argv)
+    options, settings = parameters(args)
+    file_format = '.' + args.format
+
+    os.makedirs(args.out, exist_ok=True)
+
+    # sources of the same name from different folders: the first one
+    # keeps it, the others get name_2, name_3... not used by another file
+    sources = list(dict.fromkeys(args.batch))
+    basenames = [os.path.splitext(os.path.basename(s))[0] for s in sources]
+    targets, names, seen = {}, set(basenames), set()
+    for source, basename in zip(sources, basenames):
+        name, n = basename, 2
+        if basename in seen:
+            while name in names:
+                name = f'{basename}_{n}'
+                n += 1
+            names.add(name)
+        seen.add(basename)
+        targets[source] = os.path.join(args.out, name + file_format)
+
+    size_in, size_out, failed = 0, 0, 0
+    renditions = {}  # suffix: (files, bytes)
+    start = time.monotonic()
+
+    with ProcessPoolExecutor(max_workers=max(1, args.jobs)) as pool:
+        futures = {
+            pool.submit(convert, s, r, options, settings, file_format,
+                        args.chunks, args.entries): s
+            for s, r in targets.items()
+        }
+        for future in as_completed(futures):
+            source = futures[future]
+            try:
+                err, files = future.result()
+            except Exception as e:
+                err = str(e)
+            if err is not None:
+                failed += 1
+                print(f'{source}: {err}', file=sys.stderr)
+                continue
+            size_in += os.path.getsize(source)
+            for file in files:
+                size = os.path.getsize(file)
+                size_out += size
+                suffix = os.path.basename(file).removeprefix(
+                    os.path.splitext(os.path.basename(targets[source]))[0])
+                count, total = renditions.get(suffix, (0, 0))
+                renditions[suffix] = (count + 1, total + size)
+            print(f'{source} -> {", ".join(files)}')
+
+    elapsed = time.monotonic() - start
+    done = len(targets) - failed
+    mb = 1024 ** 2
+    print(
+        f'{done} of {len(targets)} files in {elapsed:.1f} s, '
+        f'{done / elapsed if elapsed else 0:.2f} files/s, '
+        f'{size_in / mb:.1f} MB in, {size_out / mb:.1f} MB out'
+    )
+    if args.entries:
+        for suffix, (count, total) in renditions.items():
+            print(f'  {suffix.lstrip("-")}: {count} files, '
+                  f'{total / mb:.1f} MB, {total / count / mb:.2f} MB '
+                  f'per file')
+    return 1 if failed else 0
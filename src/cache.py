@@ -0,0 +1,111 @@
+# cache.py
+#
+# Copyright 2026 Golodnikov Sergey
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty
+# of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+
+# content-addressed file cache in the cache dir,
+# the file modification time is the LRU order
+
+import hashlib
+import os
+import shutil
+import tempfile
+import threading
+
+
+MB = 1024 ** 2
+
+PALETTE_LIMIT = 16 * MB
+
+
+def fingerprint(path: str):
+    st = os.stat(path)
+    return f'{os.path.abspath(path)}:{st.st_size}:{st.st_mtime_ns}'
+
+
+def key(*parts):
+    return hashlib.sha256('\0'.join(map(str, parts)).encode()).hexdigest()
+
+
+class Cache:
+    def __init__(self, root: str, limit: int, suffix=''):
+        self.root = root
+        os.makedirs(self.root, exist_ok=True)
+        self.limit = limit  # bytes
+        self.suffix = suffix
+        self.hits, self.misses = 0, 0
+        self.lock = threading.Lock()
+
+    def path(self, key: str):
+        return os.path.join(self.root, key + self.suffix)
+
+    def get(self, key: str):
+        path = self.path(key)
+        with self.lock:
+            try:
+                os.utime(path)
+            except FileNotFoundError:
+                self.misses += 1
+                return None
+            self.hits += 1
+        return path
+
+    def has(self, key: str):
+        # without counting a hit or a miss
+        return os.path.exists(self.path(key))
+
+    def put(self, key: str, file: str):
+        # a hard link if possible, the file stays where it is
+        fd, tmp = tempfile.mkstemp(dir=self.root, suffix='.tmp')
+        os.close(fd)
+        try:
+            os.remove(tmp)
+            try:
+                os.link(file, tmp)
+            except OSError:
+                shutil.copyfile(file, tmp)
+            os.replace(tmp, self.path(key))
+        except OSError:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            return None
+        self.evict()
+        return self.path(key)
+
+    def evict(self):
+        with self.lock:
+            entries = []
+            with os.scandir(self.root) as it:
+                for entry in it:
+                    if not entry.name.endswith(self.suffix) or \
+                            entry.name.endswith('.tmp'):
+                        continue
+                    try:
+                        st = entry.stat()
+                    except FileNotFoundError:
+                        continue
+                    entries.append((st.st_mtime, st.st_size, entry.path))
+            total = sum(e[1] for e in entries)
+            for _mtime, size, path in sorted(entries):
+                if total <= self.limit:
+                    break
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                total -= size
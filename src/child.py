@@ -0,0 +1,118 @@
+# child.py
+#
+# Copyright 2026 Golodnikov Sergey
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty
+# of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+
+# ffmpeg/ffprobe child processes: stderr is read as it comes and only
+# the last lines are kept, -progress blocks are passed to the listeners
+
+from collections import deque
+import re
+import subprocess
+import threading
+
+from . import timing
+
+
+STDERR_LINES = 50
+LINE_LIMIT = 4096  # bytes, the rest of a longer line is dropped
+READ_SIZE = 65536
+
+
+def progress_parse(line: bytes):
+    # key=value blocks, each one ends with "progress"
+    key, _, value = line.decode('utf-8', 'replace').strip().partition('=')
+    return key, value
+
+
+class Child:
+    def __init__(self, cmd: list, progress=False, collect=False,
+                 lines=STDERR_LINES):
+        # progress: -progress on stdout, for the listeners;
+        # collect: stdout is kept in self.output
+        if progress:
+            cmd = [cmd[0], '-progress', 'pipe:1', '-nostats', *cmd[1:]]
+        self.cmd = cmd
+        self.progress = progress
+        self.collect = collect
+        self.listeners = []  # callback(dict)
+        self.stderr = deque(maxlen=lines)
+        self.output = b''
+        self.usage = None  # resource usage, after wait()
+        self.process = subprocess.Popen(
+            cmd,
+            stdout=subprocess.PIPE if progress or collect
+            else subprocess.DEVNULL,
+            stderr=subprocess.PIPE,
+        )
+
+    @property
+    def returncode(self):
+        return self.process.returncode
+
+    @property
+    def error(self):
+        return '\n'.join(self.stderr)
+
+    def listen(self, callback):
+        self.listeners.append(callback)
+
+    def drain(self):
+        # \r is a line end too (ffmpeg statistics)
+        tail = b''
+        while chunk := self.process.stderr.read1(READ_SIZE):
+            parts = re.split(rb'[\r\n]', tail + chunk)
+            tail = parts.pop()[-LINE_LIMIT:]
+            for part in parts:
+                if part.strip():
+                    self.stderr.append(
+                        part[:LINE_LIMIT].decode('utf-8', 'replace'))
+        if tail.strip():
+            self.stderr.append(tail.decode('utf-8', 'replace'))
+
+    def follow(self):
+        block = {}
+        for line in self.process.stdout:
+            key, value = progress_parse(line)
+            block[key] = value
+            if key == 'progress':
+                for callback in self.listeners:
+                    callback(block)
+                block = {}
+
+    def wait(self):
+        reader = threading.Thread(target=self.drain, daemon=True)
+        reader.start()
+        if self.progress:
+            self.follow()
+        elif self.collect:
+            self.output = self.process.stdout.read()
+        self.usage = timing.wait(self.process)
+        reader.join()
+        return self.returncode
+
+    def terminate(self):
+        if self.process.poll() is None:
+            self.process.terminate()
+
+
+def run(cmd: list, collect=False):
+    # finished Child
+    process = Child(cmd, collect=collect)
+    process.wait()
+    return process
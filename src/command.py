@@ -0,0 +1,233 @@
+# command.py
+#
+# Copyright 2026 Golodnikov Sergey
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty
+# of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+
+# ffmpeg command builder, shared by the application and the batch mode,
+# must not import Gtk/Adw
+
+import math
+
+from . import data
+
+
+def sampling(settings: dict, fps: int, duration: int):
+    # frames for palettegen, an empty string for all frames
+    mode = data.palette_sampling[settings['palette-sampling']]
+    value = max(1, settings['palette-sampling-value'])
+    match mode:
+        case 'nth':
+            n = value
+        case 'scene':
+            # the first frame is always taken
+            return f"select='eq(n\\,0)+gt(scene\\,{value / 100})',"
+        case 'budget':
+            frames = duration / 1000000 * fps
+            n = math.ceil(frames / value) if frames > value else 1
+        case _:
+            n = 1
+    if n <= 1:
+        return ''
+    return f"select='not(mod(n\\,{n}))',"
+
+
+def preparation(options: dict, settings: dict, file_format: str,
+                duration=0):
+    width = options['image-width']
+    height = options['image-height']
+
+    if options['ratio']:
+        scale = f"scale={width}:-1"
+    else:
+        scale = f'scale={width}:{height}'
+
+    scaler = data.scaler[options['scaler']]
+    if settings['accurate-rnd']:
+        scaler += '+accurate_rnd'
+
+    fps = f"fps={options['fps']}"
+    rest = f'{scale}:flags={scaler}'
+
+    if settings['decimate']:
+        # with -vsync 0 the remaining frames keep their timestamps,
+        # the previous frame is shown longer
+        lo = 64 * settings['decimate-threshold']
+        rest += f',mpdecimate=hi={lo * 12 // 5}:lo={lo}:frac=0.33'
+
+    uno = f'{fps},{rest}'
+
+    optimize = data.optimize[settings['optimize']]
+
+    if file_format == '.gif':
+        # palette generation
+        dither = data.dither[options['dither']]
+        if dither == 'bayer':
+            bs = settings['bayer-scale']
+            dither += ':bayer_scale=' + str(bs)
+
+        palette = data.palette[settings['stats-mode']]
+        palette += f":max_colors={options['max-colors']}"
+
+        # fps and select depend only on the timestamps, the frames
+        # left out are not scaled
+        select = sampling(settings, options['fps'], duration)
+        dos = f'{fps},{select}{rest},palettegen=stats_mode={palette}'
+        tres = f"paletteuse=dither={dither}"
+        if optimize != 'none':
+            # only the changed rectangle is dithered again, so the
+            # encoder (offsetting and transdiff are its defaults) finds
+            # more unchanged pixels; one level for GIF, see data.optimize
+            tres += ':diff_mode=rectangle'
+    else:
+        dos, tres = None, None  # for palette only
+
+    if file_format == '.webp':
+        cuatro = [
+            '-c:v', 'libwebp',
+            '-lossless',
+            '1' if settings['webp-lossless'] else '0',
+            '-q:v',
+            str(settings['webp-quality']),
+            '-preset',
+            data.webp_presets[settings['webp-preset']],
+            '-compression_level',
+            str(settings['webp-compression']),
+            '-loop', '0', '-vsync', '0', '-y',
+        ]
+        if optimize != 'none':
+            # blocks that did not change are not encoded again
+            cuatro[-5:-5] = [
+                '-cr_threshold', str(data.webp_cr_threshold[optimize]),
+                '-cr_size', '16',
+            ]
+    else:
+        cuatro = ['-vsync', '0', '-y']
+
+    return (uno, dos, tres, cuatro)
+
+
+def seconds(microseconds: int):
+    return f'{microseconds / 1000000:.6f}'
+
+
+def seek(source: str, start: int, end: int, duration: int, keyframes: list):
+    # input options and the trim filter for a range: the input is seeked
+    # to the keyframe at or before the start without decoding, the exact
+    # cut is made by trim on the decoded frames
+    if start <= 0 and (end >= duration or duration <= 0):
+        return ['-i', source], ''
+    if not keyframes:
+        return ['-ss', seconds(start), '-to', seconds(end), '-i', source], ''
+    keyframe = max((k for k in keyframes if k <= start), default=0)
+    # -t stops the decoding at the end of the range
+    src = ['-t', seconds(end - keyframe), '-i', source]
+    if keyframe > 0:
+        src = ['-noaccurate_seek', '-ss', seconds(keyframe), *src]
+    trim = (f'trim=start={seconds(start - keyframe)}'
+            f':duration={seconds(end - start)},setpts=PTS-STARTPTS')
+    return src, trim
+
+
+def frame_rate(args: tuple):
+    # output frame rate, the first filter of uno
+    return float(args[0].split(',', 1)[0].removeprefix('fps='))
+
+
+def palettegen(args: tuple):
+    # the palette filters (sampling included) for frames that went
+    # through uno already, see preparation()
+    uno, dos = args[0], args[1]
+    fps, _, rest = uno.partition(',')
+    select, _, palette = dos.removeprefix(f'{fps},').partition(f'{rest},')
+    return select + palette
+
+
+def draft(options: dict, settings: dict):
+    # reduced size and frame rate, the filters stay the same
+    options = dict(options)
+    width = min(options['image-width'], settings['draft-width'])
+    options['image-height'] = max(
+        2, round(options['image-height'] * width / options['image-width']))
+    options['image-width'] = width
+    options['fps'] = min(options['fps'], settings['draft-fps'])
+    return options
+
+
+def generate(src: list, args: tuple, file_format: str,
+             result: str, palette: str, single_pass=False, tap=False,
+             cached=False, store=False, trim=''):
+    # list of (stage, command), to be run in order;
+    # trim: filters for the exact range, see seek();
+    # tap: palettegen gives no frames until the end, a copy of the
+    # stream goes to a null output to have -progress while decoding;
+    # cached: the palette file already exists;
+    # store: the single pass also writes the palette file
+    uno, dos, tres, cuatro = args
+    lead = f'{trim},' if trim else ''
+    uno = lead + uno
+    dos = dos and lead + dos
+
+    cmd = ['ffmpeg', '-v', 'error', *src, '-an']
+
+    if file_format == '.gif' and single_pass and not cached:
+        # one decode for both filters, the palette stays in memory
+        filters = palettegen(args)
+        branches = '[a][b][t]' if tap else '[a][b]'
+        graph = [f'{uno},split={len(branches) // 3} {branches}']
+        if store:
+            graph.append(f'[a] {filters},split [p][s]')
+        else:
+            graph.append(f'[a] {filters} [p]')
+        graph.append(f'[b][p] {tres} [r]')
+        cmd.extend((
+            '-filter_complex', '; '.join(graph),
+            '-map', '[r]', *cuatro, result,
+        ))
+        if store:
+            cmd.extend(('-map', '[s]', palette))
+        if tap:
+            cmd.extend(('-map', '[t]', '-f', 'null', '-'))
+        return [('generation', cmd)]
+
+    if file_format == '.gif':
+        cmd.extend((
+            '-i', palette,
+            '-filter_complex', f'{uno} [x]; [x][1:v] {tres}',
+            *cuatro, result,
+        ))
+        if cached:
+            return [('generation', cmd)]
+        if tap:
+            # split after fps, the tapped frames are not scaled
+            fps, _, filters = args[1].partition(',')
+            first = [
+                'ffmpeg', '-v', 'error', *src,
+                '-filter_complex',
+                f'{lead}{fps},split [a][t]; [a] {filters} [p]',
+                '-map', '[p]', '-y', palette,
+                '-map', '[t]', '-f', 'null', '-',
+            ]
+        else:
+            first = [
+                'ffmpeg', '-v', 'error', *src,
+                '-vf', dos, '-y', palette,
+            ]
+        return [('palette', first), ('generation', cmd)]
+
+    cmd.extend(('-vf', uno, *cuatro, result))
+    return [('generation', cmd)]
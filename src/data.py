@@ -56,6 +56,34 @@ palette = (
     'single',
 )
 
+# frame selection for palette generation
+palette_sampling = (
+    'none',
+    'nth',
+    'scene',
+    'budget',
+)
+
+# conversion engine, see backend.py
+engine = (
+    'ffmpeg',
+    'pyav',
+)
+
+# output optimization level, GIF has only none and one level (the
+# preferences show two items for it)
+optimize = (
+    'none',
+    'balanced',
+    'maximum',
+)
+
+# WebP: conditional replenishment threshold of the optimize levels
+webp_cr_threshold = {
+    'balanced': 4,
+    'maximum': 12,
+}
+
 # dithering mode
 dither = (
     'atkinson',
@@ -85,6 +113,42 @@ webp_presets = (
     'text',
 )
 
+# default values, the same as in the gschema
+defaults = {
+    'image-width': 1280,
+    'image-height': 720,
+    'scaler': 6,
+    'ratio': True,
+    'fps': 24,
+    'dither': 1,
+    'max-colors': 256,
+    'accurate-rnd': False,
+    'stats-mode': 1,
+    'bayer-scale': 2,
+    'palette-sampling': 0,
+    'palette-sampling-value': 10,
+    'palette-budget': 0,
+    'optimize': 0,
+    'decimate': False,
+    'decimate-threshold': 5,
+    'single-pass': False,
+    'parallel': False,
+    'engine': 0,
+    'renditions': '',
+    'target-size': 0.0,
+    'timing-log': False,
+    'output-directory': '',
+    'proxy': False,
+    'draft-live': False,
+    'draft-width': 320,
+    'draft-fps': 10,
+    'draft-duration': 10,
+    'webp-lossless': False,
+    'webp-quality': 75,
+    'webp-preset': 0,
+    'webp-compression': 4,
+}
+
 # ------------------------------------------------------------------------------
 
 timestamp_help = _(
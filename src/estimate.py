@@ -0,0 +1,152 @@
+# estimate.py
+#
+# Copyright 2026 Golodnikov Sergey
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty
+# of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+
+# target file size: the output size is extrapolated from short sampled
+# windows of the range, the parameters are reduced step by step until
+# the estimate fits, time values are in microseconds
+
+import os
+
+from . import child, command
+
+
+WINDOWS = 3
+WINDOW_LENGTH = 2000000
+
+# sampled windows have their own palettes and compress a bit better
+MARGIN = 0.95
+
+MIN_WIDTH = 160
+MIN_FPS = 5
+MIN_COLORS = 32
+MIN_QUALITY = 20
+
+
+class EstimateError(Exception):
+    pass
+
+
+def windows(start: int, end: int):
+    # evenly spread windows, or the whole range if it is short
+    length = end - start
+    if length <= WINDOWS * WINDOW_LENGTH * 2:
+        return [(start, end)]
+    step = (length - WINDOW_LENGTH) / (WINDOWS - 1)
+    return [(round(start + i * step), round(start + i * step) + WINDOW_LENGTH)
+            for i in range(WINDOWS)]
+
+
+def ladder(options: dict, settings: dict, file_format: str):
+    # parameter sets from the original to the smallest, one parameter is
+    # reduced at every step: width, frame rate, colors or quality
+    options, settings = dict(options), dict(settings)
+    steps = [(options, settings)]
+    while True:
+        changed = False
+        for parameter in ('width', 'fps', 'quality'):
+            options, settings = dict(options), dict(settings)
+            match parameter:
+                case 'width':
+                    width = max(MIN_WIDTH, int(options['image-width'] * 0.85))
+                    if width == options['image-width']:
+                        continue
+                    ratio = width / options['image-width']
+                    options['image-width'] = width
+                    options['image-height'] = max(
+                        2, round(options['image-height'] * ratio))
+                case 'fps':
+                    fps = max(MIN_FPS, int(options['fps'] * 0.8))
+                    if fps == options['fps']:
+                        continue
+                    options['fps'] = fps
+                case 'quality' if file_format == '.gif':
+                    colors = max(MIN_COLORS, int(options['max-colors']) // 2)
+                    if colors == int(options['max-colors']):
+                        continue
+                    options['max-colors'] = colors
+                case 'quality':
+                    if settings['webp-lossless']:
+                        continue
+                    quality = max(MIN_QUALITY, settings['webp-quality'] - 10)
+                    if quality == settings['webp-quality']:
+                        continue
+                    settings['webp-quality'] = quality
+            steps.append((options, settings))
+            changed = True
+        if not changed:
+            return steps
+
+
+def measure(source: str, spans: list, options: dict, settings: dict,
+            file_format: str, workspace: str, usages: list, started=None):
+    # extrapolated size in bytes for the whole range;
+    # started(process): each sample encode, e.g. to be cancelled
+    total_bytes, total_time = 0, 0
+    for i, (start, end) in enumerate(spans):
+        args = command.preparation(options, settings, file_format, end - start)
+        src = [
+            '-ss', command.seconds(start), '-to', command.seconds(end),
+            '-i', source,
+        ]
+        file = os.path.join(workspace, f'sample-{i}{file_format}')
+        palette = os.path.join(workspace, f'sample-{i}.png')
+        for _stage, cmd in command.generate(
+                src, args, file_format, file, palette, single_pass=True):
+            process = child.Child(cmd)
+            if started is not None:
+                started(process)
+            process.wait()
+            usages.append(process.usage)
+            if process.returncode != 0:
+                raise EstimateError(process.error)
+        total_bytes += os.path.getsize(file)
+        total_time += end - start
+        os.remove(file)
+    return total_bytes, total_time
+
+
+def search(source: str, start: int, end: int, options: dict, settings: dict,
+           file_format: str, budget: int, workspace: str,
+           cancelled=lambda: False, usages=None, started=None):
+    # binary search over the ladder for the first set under the budget,
+    # the smallest one if nothing fits; returns (options, settings, bytes)
+    usages = [] if usages is None else usages
+    spans = windows(start, end)
+    steps = ladder(options, settings, file_format)
+    estimates = {}
+
+    def estimate(index: int):
+        if index not in estimates:
+            size, length = measure(
+                source, spans, *steps[index], file_format, workspace,
+                usages, started)
+            estimates[index] = round(size * (end - start) / length)
+        return estimates[index]
+
+    low, high = 0, len(steps) - 1
+    while low < high:
+        if cancelled():
+            return None
+        middle = (low + high) // 2
+        if estimate(middle) <= budget * MARGIN:
+            high = middle
+        else:
+            low = middle + 1
+    return (*steps[low], estimate(low))
@@ -0,0 +1,565 @@
+# jobs.py
+#
+# Copyright 2026 Golodnikov Sergey
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty
+# of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+
+# conversion queue, every job works in its own directory,
+# callbacks are called from worker threads
+
+import itertools
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+from . import backend, cache, child, command, estimate, parallel, proxy
+from . import quantize, rendition, timing
+
+
+TMP_NAME = 'result'
+FINISHED_LIMIT = 8  # finished jobs kept with their files
+
+QUEUED, RUNNING, DONE, FAILED, CANCELLED = \
+    'queued', 'running', 'done', 'failed', 'cancelled'
+
+counter = itertools.count(1)
+
+
+def alive(pid: int):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def sweep(root: str):
+    # workspaces of processes that are gone, e.g. after a crash
+    try:
+        entries = list(os.scandir(root))
+    except OSError:
+        return
+    for entry in entries:
+        if not entry.name.startswith('.job-') or \
+                not entry.is_dir(follow_symlinks=False):
+            continue
+        try:
+            pid = int(entry.name.split('-')[1])
+        except (IndexError, ValueError):
+            continue
+        if not alive(pid):
+            shutil.rmtree(entry.path, ignore_errors=True)
+
+
+def weight(size: tuple):
+    # approximate number of cores loaded by one ffmpeg process
+    pixels = size[0] * size[1]
+    if pixels <= 640 * 480:
+        return 1
+    if pixels <= 1920 * 1080:
+        return 2
+    if pixels <= 3840 * 2160:
+        return 4
+    return 8
+
+
+class Job:
+    def __init__(self, root: str, source: str, src: list, args: tuple,
+                 file_format: str, size: tuple, duration: int,
+                 single_pass=False, palettes=None, results=None,
+                 draft=False, spans=(), target=None, trim='', engine=None,
+                 budget=0):
+        self.id = next(counter)
+        self.background = False  # not a conversion, see Proxy
+        self.source = source
+        self.src = src
+        self.trim = trim  # exact cut after the input seek
+        self.args = args
+        self.file_format = file_format
+        self.size = size
+        self.duration = duration  # microseconds
+        self.single_pass = single_pass
+        self.palettes = palettes  # cache.Cache
+        self.results = results  # cache.Cache
+        self.draft = draft
+        self.spans = spans  # time chunks for the parallel encoding
+        # target size: budget (bytes), options, settings, start, end
+        self.target = target
+        # backend.Subprocess or backend.PyAV
+        self.engine = engine if engine is not None else backend.SUBPROCESS
+        # pixels for the NumPy palette, 0: palettegen
+        self.budget = budget if quantize.available() else 0
+        self.predicted = None  # bytes
+        # microseconds: (decoded by this job, by the same outputs
+        # as separate jobs), for the segment lists
+        self.decoded = None
+        self.cached = False
+        self.restoring = False  # a cached result is copied, no load
+        self.timings = timing.Timings()
+
+        # hidden, the root can be the output directory;
+        # the process id is for sweep()
+        self.workspace = tempfile.mkdtemp(
+            prefix=f'.job-{os.getpid()}-{self.id}-', dir=root)
+        self.result = os.path.join(self.workspace, TMP_NAME + file_format)
+        self.palette = os.path.join(self.workspace, 'palette.png')
+
+        self.state = QUEUED
+        self.stage = ''
+        self.error = ''
+
+        self.processes = []
+        self.cancelled = False
+        # progress
+        self.lock = threading.Lock()
+        self.started = 0
+        self.percent = 0.0
+        self.speed = 0.0  # encoding fps
+        self.eta = None  # seconds
+        self.frames = 0  # written by the last stage
+
+    @property
+    def load(self):
+        if self.restoring:
+            return 0
+        return weight(self.size) * max(1, len(self.spans))
+
+    @property
+    def expected(self):
+        # frames without dropped duplicates
+        return round(self.duration / 1000000 * command.frame_rate(self.args))
+
+    @property
+    def name(self):
+        basename = os.path.splitext(os.path.basename(self.source))[0]
+        if self.draft:
+            basename += '-draft'
+        return basename + self.file_format
+
+    def outputs(self):
+        # (file, name, rendition) of every output
+        return [(self.result, self.name, None)]
+
+    def palette_key(self):
+        # everything the palette depends on: source, range and the filters
+        return cache.key(cache.fingerprint(self.source), *self.src,
+                         self.trim, self.args[1], self.budget)
+
+    def result_key(self):
+        # the single pass gives the same file, it is not a part of the key;
+        # the budget is 0 for palettegen and without NumPy
+        return cache.key(cache.fingerprint(self.source), *self.src,
+                         self.trim, repr(self.args), self.budget)
+
+    def restorable(self):
+        # a result in the cache, checked without counting a hit
+        return self.results is not None and self.target is None and \
+            self.results.has(self.result_key())
+
+    def restore(self):
+        # result of the same conversion, without running ffmpeg;
+        # a copy between file systems can take a while, see run()
+        try:
+            path = self.results.get(self.result_key())
+            if path is None:
+                return False
+            try:
+                os.link(path, self.result)
+            except OSError:
+                shutil.copyfile(path, self.result)
+        except OSError:
+            return False
+        self.cached = True
+        return True
+
+    def palette_cached(self, key: str):
+        path = self.palettes.get(key)
+        if path is None:
+            return False
+        try:
+            shutil.copyfile(path, self.palette)
+        except OSError:
+            return False
+        return True
+
+    def steps(self, cached: bool, store: bool):
+        # list of (stage, [(command, duration)]),
+        # the commands of one stage run at the same time
+        if len(self.spans) > 1:
+            # GIF, see parallel.FORMATS
+            steps = []
+            if not cached:
+                stage, cmd = command.generate(
+                    self.src, self.args, self.file_format, self.result,
+                    self.palette, tap=True, trim=self.trim)[0]
+                steps.append((stage, [(cmd, self.duration)]))
+            steps.extend(parallel.steps(
+                self.source, self.spans, self.args, self.palette,
+                self.workspace, self.result))
+            return steps
+        commands = command.generate(
+            self.src, self.args, self.file_format, self.result, self.palette,
+            single_pass=self.single_pass, tap=True,
+            cached=cached, store=store, trim=self.trim,
+        )
+        return [(stage, [(cmd, self.duration)]) for stage, cmd in commands]
+
+    def fit(self, progress):
+        # the parameters are known after the size estimation
+        t = self.target
+        start, usages = time.monotonic(), []
+
+        def started(process):
+            # the sample encodes are stopped by terminate()
+            self.processes = [process]
+            if self.cancelled:
+                self.terminate()
+
+        try:
+            found = estimate.search(
+                self.source, t['start'], t['end'], t['options'],
+                t['settings'], self.file_format, t['budget'], self.workspace,
+                cancelled=lambda: self.cancelled, usages=usages,
+                started=started,
+            )
+        except estimate.EstimateError as err:
+            if not self.cancelled:
+                self.error = str(err)
+            found = None
+        self.processes = []
+        self.timings.children('estimate', time.monotonic() - start, usages)
+        if found is None:
+            return False
+        options, settings, self.predicted = found
+        self.args = command.preparation(
+            options, settings, self.file_format, self.duration)
+        self.size = (options['image-width'], options['image-height'])
+        if self.spans:
+            # the chunk edges must stay on the output frames
+            self.spans = parallel.regrid(
+                self.spans, command.frame_rate(self.args))
+        if progress is not None:
+            progress(self)
+        return True
+
+    def run(self, progress=None):
+        if self.restoring:
+            self.stage = 'cache'
+            with self.timings.measure('cache'):
+                if self.restore():
+                    return True
+            # evicted meanwhile, converted with the load of a restore
+            self.restoring = False
+        if self.target is not None:
+            self.stage = 'estimate'
+            if not self.fit(progress):
+                return False
+        key, cached = None, False
+        if self.file_format == '.gif' and self.palettes is not None:
+            key = self.palette_key()
+            cached = self.palette_cached(key)
+        self.started = time.monotonic()
+        if self.file_format == '.gif' and self.budget and not cached:
+            self.stage = 'palette'
+            if not self.palette_quantize():
+                return False
+            if key is not None:
+                self.palettes.put(key, self.palette)
+            # the generation uses it like a cached one
+            cached = True
+        if not self.engine.generate(self, cached, key is not None, progress):
+            return False
+        if key is not None and not cached:
+            self.palettes.put(key, self.palette)
+        if self.results is not None:
+            self.results.put(self.result_key(), self.result)
+        return True
+
+    def palette_quantize(self):
+        # the palette of palettegen, made by quantize.py
+        process = child.Child(quantize.pipe(
+            self.src, self.args, self.size, self.duration, self.budget,
+            trim=self.trim), collect=True)
+        self.processes = [process]
+        if self.cancelled:
+            self.terminate()
+        started = time.monotonic()
+        process.wait()
+        self.processes = []
+        self.timings.children(
+            'sampling', time.monotonic() - started, [process.usage])
+        if self.cancelled:
+            return False
+        if process.returncode != 0:
+            self.error = process.error
+            return False
+        try:
+            with self.timings.measure('quantize'):
+                quantize.palette(
+                    process.output, self.args, self.budget, self.palette)
+        except (quantize.QuantizeError, OSError) as err:
+            self.error = str(err)
+            return False
+        return True
+
+    def execute(self, commands: list, index: int, count: int, progress):
+        total = sum(duration for _, duration in commands)
+        positions = [0] * len(commands)
+        speeds = [0.0] * len(commands)
+        frames = [0] * len(commands)
+        usages = [None] * len(commands)
+        errors = []
+        started = time.monotonic()
+
+        processes = [child.Child(cmd, progress=True) for cmd, _ in commands]
+        self.processes = processes
+        if self.cancelled:
+            self.terminate()
+
+        def follow(i: int, process):
+            def listener(block: dict):
+                if block.get('out_time_us', '').isdigit():
+                    positions[i] = int(block['out_time_us'])
+                if block.get('frame', '').isdigit():
+                    frames[i] = int(block['frame'])
+                try:
+                    speeds[i] = float(block.get('fps', ''))
+                except ValueError:
+                    pass
+                with self.lock:
+                    self.speed = sum(speeds)
+                    fraction = 0.0
+                    if total > 0:
+                        fraction = min(1.0, sum(positions) / total)
+                    self.progress_update((index + fraction) / count)
+                if progress is not None:
+                    progress(self)
+
+            process.listen(listener)
+            process.wait()
+            usages[i] = process.usage
+            if process.returncode != 0:
+                errors.append(process.error)
+
+        threads = [threading.Thread(target=follow, args=(i, p), daemon=True)
+                   for i, p in enumerate(processes)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.processes = []
+        self.frames = sum(frames)
+        self.timings.children(
+            self.stage, time.monotonic() - started, usages)
+
+        if self.cancelled:
+            return False
+        if errors:
+            self.error = '\n'.join(errors)
+            return False
+        return True
+
+    def progress_update(self, fraction: float):
+        self.percent = fraction * 100
+        elapsed = time.monotonic() - self.started
+        if self.percent > 0:
+            self.eta = elapsed * (100 - self.percent) / self.percent
+
+    def terminate(self):
+        self.cancelled = True
+        for process in self.processes:
+            process.terminate()
+
+    def cleanup(self):
+        shutil.rmtree(self.workspace, ignore_errors=True)
+
+
+class Renditions(Job):
+    # a rendition set from one decode, self.result is the first one
+    def __init__(self, root: str, source: str, src: list, renditions: list,
+                 duration: int, single_pass=False, trim=''):
+        first = renditions[0]
+        super().__init__(
+            root, source, src, first['args'], first['format'],
+            first['size'], duration, single_pass=single_pass, trim=trim)
+        self.renditions = renditions
+        self.files = [
+            os.path.join(self.workspace, TMP_NAME + r['suffix'] + r['format'])
+            for r in renditions]
+        self.palette_files = [
+            os.path.join(self.workspace, f'palette{r["suffix"]}.png')
+            for r in renditions]
+        self.result = self.files[0]
+
+    @property
+    def load(self):
+        return sum(weight(r['size']) for r in self.renditions)
+
+    @property
+    def names(self):
+        basename = os.path.splitext(os.path.basename(self.source))[0]
+        return [basename + r['suffix'] + r['format']
+                for r in self.renditions]
+
+    @property
+    def name(self):
+        return self.names[0]
+
+    def outputs(self):
+        # (file, name, rendition) of every output
+        return list(zip(self.files, self.names, self.renditions))
+
+    def restore(self):
+        # the sets are not in the result cache
+        return False
+
+    def steps(self, _cached: bool, _store: bool):
+        commands = rendition.generate(
+            self.src, self.renditions, self.files, self.palette_files,
+            single_pass=self.single_pass, trim=self.trim)
+        return [(stage, [(cmd, self.duration)]) for stage, cmd in commands]
+
+
+class Proxy(Job):
+    # the preview copy of a source, see proxy.py; it shares the cores
+    # with the conversions and is stored in the proxies cache
+    def __init__(self, root: str, source: str, size: tuple, duration: int,
+                 proxies: cache.Cache):
+        super().__init__(root, source, ['-i', source], ('', None, None, []),
+                         '.mkv', size, duration)
+        self.background = True
+        self.proxies = proxies
+        self.file = None  # in the cache
+
+    def run(self, progress=None):
+        self.stage = 'proxy'
+        self.started = time.monotonic()
+        cmd = proxy.command(self.source, self.result)
+        if not self.execute([(cmd, self.duration)], 0, 1, progress):
+            return False
+        self.file = self.proxies.put(proxy.key(self.source), self.result)
+        return self.file is not None
+
+
+class Scheduler:
+    def __init__(self, root: str, changed=None, progress=None):
+        self.root = root
+        os.makedirs(self.root, exist_ok=True)
+        sweep(self.root)
+        self.changed = changed  # callback(job)
+        self.progress = progress  # callback(job)
+        self.cores = os.cpu_count() or 1
+        self.jobs = []
+        self.lock = threading.Lock()
+
+    def submit(self, job: Job):
+        with self.lock:
+            self.jobs.append(job)
+        self.notify(job)
+        self.dispatch()
+
+    def has(self, job: Job):
+        with self.lock:
+            return job in self.jobs
+
+    def prune(self, current=None, keep=()):
+        # finished jobs are removed with their files, except the current
+        # one and the kept ones, of these at most FINISHED_LIMIT
+        with self.lock:
+            finished = [j for j in self.jobs
+                        if j.state not in (QUEUED, RUNNING)]
+            kept = [j for j in finished if j is not current and j in keep]
+            removed = [j for j in finished
+                       if j is not current and j not in keep]
+            removed.extend(kept[:max(0, len(kept) - FINISHED_LIMIT)])
+            for job in removed:
+                self.jobs.remove(job)
+        for job in removed:
+            job.cleanup()
+        return removed
+
+    def count(self, *states):
+        # conversions only
+        with self.lock:
+            return sum(1 for j in self.jobs
+                       if j.state in states and not j.background)
+
+    def dispatch(self):
+        # start queued jobs in order while there are free cores,
+        # a single job is always allowed to run
+        start = []
+        with self.lock:
+            load = sum(j.load for j in self.jobs if j.state == RUNNING)
+            full = False
+            for job in self.jobs:
+                if job.state != QUEUED:
+                    continue
+                w = job.load
+                if w and (full or load != 0 and load + w > self.cores):
+                    # the order is kept, the restores go on
+                    full = True
+                    continue
+                load += w
+                job.state = RUNNING
+                start.append(job)
+        for job in start:
+            self.notify(job)
+            threading.Thread(
+                target=self.execute, args=(job,), daemon=True).start()
+
+    def execute(self, job: Job):
+        try:
+            ok = job.run(self.progress)
+        except Exception as err:
+            job.error, ok = str(err), False
+        if job.cancelled:
+            # partial files are not needed
+            job.cleanup()
+            job.state = CANCELLED
+        else:
+            job.state = DONE if ok else FAILED
+        self.notify(job)
+        self.dispatch()
+
+    def cancel(self, job: Job):
+        with self.lock:
+            if job.state not in (QUEUED, RUNNING):
+                return
+            queued = job.state == QUEUED
+            job.cancelled = True
+            if queued:
+                job.state = CANCELLED
+        if queued:
+            job.cleanup()
+            self.notify(job)
+        else:
+            job.terminate()
+
+    def notify(self, job: Job):
+        if self.changed is not None:
+            self.changed(job)
+
+    def cleanup(self):
+        with self.lock:
+            for job in self.jobs:
+                job.terminate()
+                job.cleanup()
+            self.jobs.clear()
@@ -21,10 +21,10 @@
 from datetime import timedelta
 import os
 import re
-import shutil
 import subprocess
 import sys
 import threading
+import time
 import webbrowser
 
 import gi
@@ -32,13 +32,16 @@ gi.require_version('Gtk', '4.0')
 gi.require_version('Adw', '1')
 from gi.repository import Adw, Gdk, Gio, GLib, Gtk
 
-from . import data
+from . import backend, cache, command, data, jobs, parallel, probe
+from . import player, proxy, quantize
+from . import rendition, segment, timing, transfer
 from .window import WindowIF
 
 
 APP_VERSION = '1.1.0'
 
-TMP_NAME = 'result'
+TIMESTAMP_INTERVAL = 100  # ms, trim point updates during playback
+LIVE_DELAY = 600  # ms, option changes collected before a live draft
 
 
 class ImageFlowApplication(Adw.Application):
@@ -48,6 +51,7 @@ class ImageFlowApplication(Adw.Application):
                          resource_base_path='/tech/digiroad/ImageFlow')
         self.create_action('open', self.open_file, ['<primary>o'])
         self.create_action('about', self.about_action, None)
+        self.create_action('cancel', self.cancel_job, None)
         self.create_action('quit', lambda *_: self.quit(), ['<control>q'])
         self.create_action('preferences',
                            self.preferences_action,
@@ -63,7 +67,26 @@ class ImageFlowApplication(Adw.Application):
             'loop',
             'accurate-rnd',
             'stats-mode',
+            'palette-sampling',
+            'palette-sampling-value',
+            'palette-budget',
+            'optimize',
+            'decimate',
+            'decimate-threshold',
             'bayer-scale',
+            'single-pass',
+            'parallel',
+            'engine',
+            'renditions',
+            'result-cache',
+            'target-size',
+            'timing-log',
+            'output-directory',
+            'proxy',
+            'draft-live',
+            'draft-width',
+            'draft-fps',
+            'draft-duration',
             'webp-lossless',
             'webp-quality',
             'webp-preset',
@@ -77,6 +100,10 @@ class ImageFlowApplication(Adw.Application):
 
         self.update_theme(self.settings.get_int('theme'))
 
+        # GIF has one optimize level, see data.optimize
+        self.optimize_levels = self.w.optimize.get_model()
+        self.optimize_gif = Gtk.StringList.new(list(self.w.ts_optimize_gif))
+
         loop_state = self.settings.get_boolean('loop')
         self.w.loop.set_active(loop_state)
         self.w.video.set_loop(loop_state)
@@ -88,23 +115,68 @@ class ImageFlowApplication(Adw.Application):
         self.name, self.file_format = '', ''
 
         self.dir = GLib.get_user_cache_dir()
-        self.palette = os.path.join(self.dir, 'palette.png')
         self.sources_size = None
+        self.duration = 0
+        self.metadata = probe.Metadata(
+            os.path.join(self.dir, 'imageflow', 'probe.json'))
+        self.index = probe.Index(os.path.join(self.dir, 'imageflow', 'index'))
+        self.proxies = cache.Cache(
+            os.path.join(self.dir, 'imageflow', 'proxies'),
+            proxy.PROXY_LIMIT, '.mkv',
+        )
+        self.proxy = ''  # file played instead of the source
+        self.proxy_job = None  # jobs.Proxy
+        self.meta = {}
+        self.probe_timings = None
+        self.details_rows = []
+
+        self.palettes = cache.Cache(
+            os.path.join(self.dir, 'imageflow', 'palettes'),
+            cache.PALETTE_LIMIT, '.png',
+        )
+        self.results = cache.Cache(
+            os.path.join(self.dir, 'imageflow', 'results'),
+            self.settings.get_int('result-cache') * cache.MB,
+        )
+
+        self.job = None
+        self.scheduler = jobs.Scheduler(
+            os.path.join(self.dir, 'imageflow'),
+            lambda job: GLib.idle_add(self.job_changed, job),
+            lambda job: GLib.idle_add(self.job_progress, job),
+        )
+        # finished jobs that keep their files, see jobs_prune()
+        self.toasted, self.saving = set(), set()
+        if self.output_directory():
+            jobs.sweep(self.output_directory())
 
         self.stream = None
+        self.timestamp_pending = False
         self.enable_trim = False
         self.segment_point = 0  # 1:start, 2:end
         self.segment_format = 'h'
         self.segment_format_options = data.time_format_options['h']
         self.segment_value_start = 0
         self.segment_value_end = 0
+        self.segments = []  # (start, end), generated in one pass
 
         self.freeze = False
 
+        # GIF and WebP results
+        self.player = player.Player(self.w.animation, self.player_failed)
+        pause = Gtk.GestureClick()
+        pause.connect('pressed', lambda *_args: self.player.toggle())
+        self.w.animation.add_controller(pause)
+
         self.w.pref_theme.connect('notify::selected-item', self.theme_change)
+        self.w.output_directory_choose.connect(
+            'clicked', self.output_directory_choose)
+        self.w.output_directory_clear.connect(
+            'clicked', self.output_directory_set, '')
 
         self.w.external.connect('clicked', self.browser_preview)
         self.w.generate.connect('activated', self.generate_wrapper)
+        self.w.draft.connect('activated', self.generate_wrapper, True)
         self.w.image_height.connect('notify::value', self.size_change)
         self.w.image_size.connect('notify::selected-item', self.size_switch)
         self.w.image_width.connect('notify::value', self.size_change)
@@ -114,6 +186,10 @@ class ImageFlowApplication(Adw.Application):
         self.w.preview.connect('notify::active', self.preview_switch)
         self.w.save_file.connect('activated', self.save_file)
         self.w.trim.connect('toggled', self.trim_state)
+        self.w.keyframes.set_draw_func(self.keyframes_draw)
+        click = Gtk.GestureClick()
+        click.connect('pressed', self.keyframes_click)
+        self.w.keyframes.add_controller(click)
 
         # trim, segment
         self.w.segment_button_start.connect(
@@ -124,9 +200,23 @@ class ImageFlowApplication(Adw.Application):
             'activate', self.segment_entry_start)
         self.w.segment_entry_end.connect(
             'activate', self.segment_entry_end)
+        self.w.segment_add.connect('clicked', self.segments_add)
+        self.w.segment_clear.connect('clicked', self.segments_clear)
         # format check
         self.w.format.connect('notify::selected-item', self.format_switch)
         self.format_switch(self.w.format, None)
+        # live draft
+        self.live_timer = None
+        for widget, prop in (
+                (self.w.image_width, 'value'),
+                (self.w.image_height, 'value'),
+                (self.w.scaler, 'selected'),
+                (self.w.keep_aspect_ratio, 'active'),
+                (self.w.framerate, 'value'),
+                (self.w.dither, 'selected'),
+                (self.w.max_colors, 'value'),
+                (self.w.format, 'selected')):
+            widget.connect(f'notify::{prop}', self.live_schedule)
         # drag and drop
         drop_target = Gtk.DropTarget.new(Gio.File, Gdk.DragAction.COPY)
         drop_target.connect('drop', self.on_drop)
@@ -134,9 +224,24 @@ class ImageFlowApplication(Adw.Application):
 
     # --------------------------------------------------------------------------
 
+    def live_schedule(self, *_args):
+        # a draft when the options stop changing
+        if self.source == '' or not self.settings.get_boolean('draft-live'):
+            return
+        if self.live_timer is not None:
+            GLib.source_remove(self.live_timer)
+        self.live_timer = GLib.timeout_add(LIVE_DELAY, self.live_generate)
+
+    def live_generate(self):
+        self.live_timer = None
+        if self.w.draft.get_sensitive():
+            self.generate_wrapper(None, True)
+        return False
+
     def switch_control(self, generate: bool, preview: bool, save: bool):
         # generate
         self.w.generate.set_sensitive(generate)
+        self.w.draft.set_sensitive(generate)
         if generate:
             self.w.generate.add_css_class('warning')
         else:
@@ -154,22 +259,95 @@ class ImageFlowApplication(Adw.Application):
             self.w.save_file.add_css_class('suggested-action')
         else:
             self.w.save_file.remove_css_class('suggested-action')
+        # queue
+        self.queue_show()
+
+    def queue_show(self):
+        queued = self.scheduler.count(jobs.QUEUED)
+        running = self.scheduler.count(jobs.RUNNING)
+        if queued + running != 0:
+            self.w.generate.set_title(
+                f'{self.w.ts_generate} ({queued + running})')
+            self.w.generate.set_tooltip_text(
+                self.w.ts_queue.format(running, queued))
+        else:
+            self.w.generate.set_title(self.w.ts_generate)
+            self.w.generate.set_tooltip_text(None)
 
     # --------------------------------------------------------------------------
 
     def accept_file(self, path: str):
         self.result, self.name = '', ''
+        self.job = None
+        self.jobs_prune()
+        self.w.preview.set_title(self.w.ts_preview)
         self.source = path
-        self.w.video.set_filename(self.source)
+        self.segments_clear()
+        self.proxy_reset()
+        self.source_show()
         self.current = self.source
         self.w.open_file.remove_css_class('suggested-action')
         self.w.title.set_subtitle(os.path.basename(self.source))
         self.switch_control(generate=True, preview=False, save=False)
         self.file_parsing()
-        # stream & trim
+        self.trim_access(True)
+
+    def source_show(self, timestamp=0):
+        # the proxy has the same timestamps as the source
+        self.w.video.set_filename(self.proxy or self.source)
         self.stream = self.w.video.get_media_stream()
         self.stream.connect("notify::timestamp", self.get_timestamp)
-        self.trim_access(True)
+        if timestamp > 0:
+            stream = self.stream
+
+            def prepared(*_args):
+                if stream.is_prepared():
+                    stream.seek(timestamp)
+                    stream.disconnect(handler)
+
+            handler = stream.connect('notify::prepared', prepared)
+
+    # --------------------------------------------------------------------------
+
+    def proxy_reset(self):
+        self.proxy = ''
+        if self.proxy_job is not None:
+            self.scheduler.cancel(self.proxy_job)
+            self.proxy_job = None
+
+    def proxy_start(self, path: str, width: int, height: int):
+        if not self.settings.get_boolean('proxy') or \
+                not proxy.needed(width, height):
+            return
+        file = self.proxies.get(proxy.key(path))
+        if file is not None:
+            self.proxy_ready(path, file)
+            return
+        self.proxy_job = jobs.Proxy(
+            self.scheduler.root, path, (width, height), self.duration,
+            self.proxies)
+        self.scheduler.submit(self.proxy_job)
+
+    def proxy_done(self, job):
+        if job is self.proxy_job:
+            self.proxy_job = None
+        if job.source != self.source or job.state != jobs.DONE:
+            return
+        if self.probe_timings is not None:
+            for stage in job.timings.records():
+                self.probe_timings.add(
+                    stage['stage'], stage['wall'], stage['cpu'], stage['rss'])
+        self.proxy_ready(job.source, job.file)
+
+    def proxy_ready(self, path: str, file: str):
+        self.proxy = file
+        if self.current != path or self.stream is None:
+            return  # the result is shown
+        timestamp = self.stream.get_timestamp()
+        playing = self.stream.get_playing()
+        self.source_show(timestamp)
+        if playing:
+            self.stream.play()
 
     def on_drop(self, _drop, value, _x, _y):
         if not value:
@@ -183,41 +361,67 @@ class ImageFlowApplication(Adw.Application):
             return True
 
     def file_parsing(self):
-        result = subprocess.run([
-            'ffprobe', '-v', 'error',
-            '-select_streams', 'v',
-            '-show_entries', 'stream=width,height',
-            '-show_entries', 'format=duration',
-            '-of', 'csv=p=0', self.source
-        ], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-        if result.returncode != 0:
-            err = result.stderr.decode('utf-8').strip()
-            self.message_show('Analysis error', err)
-            return
-        lines = result.stdout.decode('utf-8').strip().split('\n')
-        if len(lines) < 2:
+        self.meta = {}
+        self.probe_timings = None
+        thread = threading.Thread(
+            target=self.file_probe, args=(self.source,), daemon=True)
+        thread.start()
+
+    def file_probe(self, path: str):
+        # worker thread
+        timings = timing.Timings()
+        try:
+            start, usages = time.monotonic(), []
+            key = cache.fingerprint(path)
+            meta = self.metadata.get(key)
+            if meta is None:
+                meta = self.engine().info(path, usages)
+                self.metadata.set(key, meta)
+            timings.children('probe', time.monotonic() - start, usages)
+            GLib.idle_add(self.file_parsed, path, meta, False, timings)
+            index = self.index.get(key)
+            if index is None:
+                start, usages = time.monotonic(), []
+                positions, packets = self.engine().keyframes(
+                    path, meta.get('start', 0), usages)
+                timings.children(
+                    'keyframes', time.monotonic() - start, usages)
+                index = {'keyframes': positions, 'packets': packets}
+                self.index.set(key, index)
+            meta = dict(meta, keyframes=index['keyframes'])
+            if meta['frames'] == 0:
+                meta['frames'] = index['packets']
+            GLib.idle_add(self.file_parsed, path, meta, True)
+        except (OSError, probe.ProbeError) as err:
+            GLib.idle_add(self.message_show, 'Analysis error', str(err))
+
+    def file_parsed(self, path: str, meta: dict, update=False,
+                    timings=None):
+        if path != self.source:
+            return  # another file is already open
+        self.meta = meta
+        if timings is not None:
+            self.probe_timings = timings
+        self.w.keyframes.queue_draw()
+        if update:
             return
-        size, duration = lines[0], lines[1]
         # duration
-        try:
-            duration = int(float(duration) * 1000000)
-            self.segment_range_set(duration, init=True)
-        except ValueError as err:
-            self.message_show('Analysis error', str(err))
+        if meta['duration'] > 0:
+            self.duration = meta['duration']
+            self.segment_range_set(self.duration, init=True)
+        else:
+            self.message_show('Analysis error', 'Unknown duration')
         # size
-        split = size.split(',')
-        if len(split) == 2:
-            try:
-                width, height = int(split[0]), int(split[1])
-                self.sources_size = (width, height)
-                if self.settings.get_boolean('detect-size'):
-                    self.freeze = True
-                    self.w.image_width.set_value(width)
-                    self.w.image_height.set_value(height)
-                    self.freeze = False
-                    self.w.image_size.set_selected(0)
-            except ValueError as err:
-                self.message_show('Analysis error', str(err))
+        width, height = meta['width'], meta['height']
+        if width > 0 and height > 0:
+            self.sources_size = (width, height)
+            if self.settings.get_boolean('detect-size'):
+                self.freeze = True
+                self.w.image_width.set_value(width)
+                self.w.image_height.set_value(height)
+                self.freeze = False
+                self.w.image_size.set_selected(0)
+            self.proxy_start(path, width, height)
 
     # --------------------------------------------------------------------------
 
@@ -276,18 +480,21 @@ class ImageFlowApplication(Adw.Application):
         dialog.show()
 
     def save_file(self, _):
+        job = self.job
+        # a rendition set is saved to a folder, with the rendition names
+        folder = len(job.outputs()) > 1
+
         def save_file_finish(dialog, result):
             try:
-                file = dialog.save_finish(result)
-                if file:
-                    fp = file.get_path()
-                    shutil.copy2(self.result, fp)
-                    toast_title = f'{self.w.ts_save} {self.name}'
-                    toast = Adw.Toast.new(title=toast_title)
-                    toast.set_button_label(button_label=self.w.ts_save_show)
-                    toast.connect('button-clicked',
-                                  lambda s: self.toast_button_show(s, fp))
-                    self.w.overlay.add_toast(toast)
+                if folder:
+                    file = dialog.select_folder_finish(result)
+                else:
+                    file = dialog.save_finish(result)
+                if file and folder:
+                    self.save_start(job, self.save_targets(
+                        job, file.get_path()))
+                elif file:
+                    self.save_start(job, [(job.result, file.get_path())])
             except Exception as err:
                 err = str(err)
                 if 'dismissed by user' not in err.lower():
@@ -295,8 +502,63 @@ class ImageFlowApplication(Adw.Application):
 
         dialog = Gtk.FileDialog.new()
         dialog.set_title('Save result')
-        dialog.set_initial_name(self.name)
-        dialog.save(self.w, None, save_file_finish)
+        if folder:
+            dialog.select_folder(self.w, None, save_file_finish)
+        else:
+            dialog.set_initial_name(self.name)
+            dialog.save(self.w, None, save_file_finish)
+
+    def save_targets(self, job, directory: str):
+        # (file, destination) of every output, existing files are kept
+        return [(file, transfer.unique(os.path.join(directory, name)))
+                for file, name, _ in job.outputs()]
+
+    def save_start(self, job, targets: list):
+        # the copy, if there is one, runs in a worker thread
+        def work():
+            try:
+                with job.timings.measure('save'):
+                    for file, fp in targets:
+                        transfer.place(file, fp, lambda f: GLib.idle_add(
+                            self.save_progress, f))
+                GLib.idle_add(self.save_complete, job, targets, None)
+            except OSError as err:
+                GLib.idle_add(self.save_complete, job, targets, str(err))
+
+        self.w.save_file.set_sensitive(False)
+        self.saving.add(job)
+        threading.Thread(target=work, daemon=True).start()
+
+    def save_progress(self, fraction: float):
+        self.w.save_file.set_title(
+            self.w.ts_saving.format(int(fraction * 100)))
+
+    def save_complete(self, job, targets: list, err):
+        self.saving.discard(job)
+        self.jobs_prune()
+        self.w.save_file.set_title(self.w.ts_save_button)
+        self.w.save_file.set_sensitive(self.result != '')
+        if err is not None:
+            self.message_show('Saving error', err)
+            return
+        if job is self.job:
+            self.details_show(job)
+        self.timing_log(job, ['save'])
+        fp = targets[0][1]
+        names = ', '.join(os.path.basename(t[1]) for t in targets)
+        toast = Adw.Toast.new(title=f'{self.w.ts_save} {names}')
+        toast.set_button_label(button_label=self.w.ts_save_show)
+        toast.connect('button-clicked',
+                      lambda s: self.toast_button_show(s, fp))
+        self.w.overlay.add_toast(toast)
+
+    def engine(self):
+        return backend.get(data.engine[self.settings.get_int('engine')])
+
+    def output_directory(self):
+        # '' if not set or not available
+        path = self.settings.get_string('output-directory')
+        return path if path and os.path.isdir(path) else ''
 
     # --------------------------------------------------------------------------
 
@@ -304,14 +566,22 @@ class ImageFlowApplication(Adw.Application):
         match obj:
             case 'display':
                 self.w.display.set_visible(True)
+                self.w.animation.set_visible(False)
+                self.w.spinner.set_visible(False)
+                self.w.external.set_visible(False)
+            case 'animation':
+                self.w.display.set_visible(False)
+                self.w.animation.set_visible(True)
                 self.w.spinner.set_visible(False)
                 self.w.external.set_visible(False)
             case 'spinner':
                 self.w.display.set_visible(False)
+                self.w.animation.set_visible(False)
                 self.w.spinner.set_visible(True)
                 self.w.external.set_visible(False)
             case 'external':
                 self.w.display.set_visible(False)
+                self.w.animation.set_visible(False)
                 self.w.spinner.set_visible(False)
                 self.w.external.set_visible(True)
 
@@ -347,7 +617,10 @@ class ImageFlowApplication(Adw.Application):
         state = toggle_button.get_active()
         self.settings.set_boolean('loop', state)
         self.w.video.set_loop(state)
-        if self.current != '':
+        self.player.set_loop(state)
+        if self.current == self.source and self.source != '':
+            self.source_show()
+        elif self.current != '' and not self.player.active:
             self.w.video.set_filename(self.current)
 
     # --------------------------------------------------------------------------
@@ -384,8 +657,17 @@ class ImageFlowApplication(Adw.Application):
     # --------------------------------------------------------------------------
 
     def get_timestamp(self, _f, _p):
-        if self.segment_point != 0:
+        # every frame changes the timestamp, the updates are coalesced
+        if self.segment_point == 0 or self.timestamp_pending:
+            return
+        self.timestamp_pending = True
+        GLib.timeout_add(TIMESTAMP_INTERVAL, self.timestamp_update)
+
+    def timestamp_update(self):
+        self.timestamp_pending = False
+        if self.segment_point != 0 and self.stream is not None:
             self.segment_range_set(self.stream.get_timestamp())
+        return GLib.SOURCE_REMOVE
 
     def segment_button_start(self, _, entry=False):
         self.enable_trim = True
@@ -415,7 +697,7 @@ class ImageFlowApplication(Adw.Application):
         text = entry.get_text()
         if re.fullmatch(self.segment_format_options[1], text):
             entry.remove_css_class('error')
-            microseconds = self.text_to_microseconds(text)
+            microseconds = self.keyframe_snap(self.text_to_microseconds(text))
             self.stream.seek(microseconds)
             self.segment_value_start = microseconds
             self.segment_button_start(None, True)
@@ -426,7 +708,7 @@ class ImageFlowApplication(Adw.Application):
         text = entry.get_text()
         if re.fullmatch(self.segment_format_options[1], text):
             entry.remove_css_class('error')
-            microseconds = self.text_to_microseconds(text)
+            microseconds = self.keyframe_snap(self.text_to_microseconds(text))
             self.stream.seek(microseconds)
             self.segment_value_end = microseconds
             self.segment_button_end(None, True)
@@ -434,6 +716,9 @@ class ImageFlowApplication(Adw.Application):
             entry.add_css_class('error')
 
     def segment_range_set(self, microseconds, init=False):
+        if self.segment_point != 0:
+            microseconds = self.keyframe_snap(microseconds)
+        self.w.keyframes.queue_draw()
         delta = timedelta(microseconds=microseconds)
         total_seconds = delta.total_seconds()
 
@@ -481,19 +766,68 @@ class ImageFlowApplication(Adw.Application):
                 self.segment_value_end = microseconds
                 self.w.segment_entry_end.set_text(value)
 
-    def segment_range_get(self):
-        return [
-            '-ss', self.microseconds_to_hms(self.segment_value_start),
-            '-to', self.microseconds_to_hms(self.segment_value_end),
-        ]
-
-    def microseconds_to_hms(self, microseconds):
-        delta = timedelta(microseconds=microseconds)
-        total_seconds = int(delta.total_seconds())
-        hours, remainder = divmod(total_seconds, 3600)
-        minutes, seconds = divmod(remainder, 60)
-        milliseconds = delta.microseconds // 1000
-        return f'{hours:02}:{minutes:02}:{seconds:02}.{milliseconds:03}'
+    def segments_add(self, _button):
+        segment = (self.segment_value_start, self.segment_value_end)
+        if segment[1] <= segment[0] or segment in self.segments:
+            return
+        self.segments.append(segment)
+        self.segments_show()
+
+    def segments_clear(self, *_args):
+        self.segments = []
+        self.segments_show()
+
+    def segments_show(self):
+        self.w.segment_clear.set_label(
+            self.w.ts_segments.format(len(self.segments)))
+        self.w.segment_clear.set_visible(len(self.segments) > 0)
+        self.w.keyframes.queue_draw()
+
+    def keyframe_snap(self, microseconds: int):
+        keyframes = self.meta.get('keyframes', [])
+        if not self.w.segment_snap.get_active() or not keyframes:
+            return microseconds
+        return min(keyframes, key=lambda k: abs(k - microseconds))
+
+    def keyframes_draw(self, area, cr, width: int, height: int):
+        if self.duration <= 0:
+            return
+        color = area.get_color()
+        # segment list
+        cr.set_source_rgba(color.red, color.green, color.blue, 0.15)
+        for start, end in self.segments:
+            x1 = start / self.duration * width
+            x2 = end / self.duration * width
+            cr.rectangle(x1, 0, max(1, x2 - x1), height)
+        cr.fill()
+        # selected range
+        if self.enable_trim:
+            x1 = self.segment_value_start / self.duration * width
+            x2 = self.segment_value_end / self.duration * width
+            cr.set_source_rgba(color.red, color.green, color.blue, 0.25)
+            cr.rectangle(x1, 0, max(1, x2 - x1), height)
+            cr.fill()
+        # keyframes
+        cr.set_source_rgba(color.red, color.green, color.blue, 0.8)
+        cr.set_line_width(1)
+        for k in self.meta.get('keyframes', []):
+            x = round(k / self.duration * width) + 0.5
+            cr.move_to(x, 0)
+            cr.line_to(x, height)
+        cr.stroke()
+
+    def keyframes_click(self, _gesture, _n, x: float, _y):
+        # the closest keyframe, for the selected point if there is one
+        keyframes = self.meta.get('keyframes', [])
+        width = self.w.keyframes.get_width()
+        if not keyframes or self.duration <= 0 or width <= 0:
+            return
+        target = x / width * self.duration
+        microseconds = min(keyframes, key=lambda k: abs(k - target))
+        if self.stream is not None:
+            self.stream.seek(microseconds)
+        if self.segment_point != 0:
+            self.segment_range_set(microseconds)
 
     def text_to_microseconds(self, text: str):
         text = text.strip()
@@ -528,26 +862,41 @@ class ImageFlowApplication(Adw.Application):
     # --------------------------------------------------------------------------
 
     def preview_switch(self, widget, _):
+        if not widget.get_active():
+            self.player.stop()
         if self.result != '':
             if widget.get_active():
-                if self.file_format == '.webp':
-                    self.stack_adjust_visibility('external')
+                if self.player.load(self.result, self.w.loop.get_active()):
+                    # the hidden video must not play
+                    self.w.video.set_filename(None)
+                    self.stack_adjust_visibility('animation')
                 else:
-                    self.w.video.set_filename(self.result)
-                    self.stack_adjust_visibility('display')
+                    self.preview_fallback()
                 self.current = self.result
                 self.w.preview.add_css_class('success')
                 # trim
                 self.trim_access(False)
             else:
                 self.stack_adjust_visibility('display')
-                self.w.video.set_filename(self.source)
+                self.source_show()
                 self.current = self.source
                 self.w.preview.remove_css_class('success')
-                # trim & stream
+                # trim
                 self.trim_access(True)
-                self.stream = self.w.video.get_media_stream()
-                self.stream.connect("notify::timestamp", self.get_timestamp)
+
+    def preview_fallback(self):
+        # without the player: the video widget or the web browser
+        if os.path.splitext(self.result)[1] == '.webp':
+            self.stack_adjust_visibility('external')
+        else:
+            self.w.video.set_filename(self.result)
+            self.stack_adjust_visibility('display')
+
+    def player_failed(self, path: str, error: str):
+        # e.g. ffmpeg without the animated WebP decoder
+        if path == self.result and self.w.preview.get_active():
+            self.preview_fallback()
+            self.message_show(self.w.ts_preview_error, error)
 
     def toast_button_show(self, _, fp: str):
         fd = os.path.dirname(fp)
@@ -605,117 +954,308 @@ class ImageFlowApplication(Adw.Application):
 
     # --------------------------------------------------------------------------
 
-    def preparation(self):
-        self.result = os.path.join(self.dir, TMP_NAME + self.file_format)
-
-        width = self.options['image-width']
-        height = self.options['image-height']
-
-        if self.options['ratio']:
-            scale = f"scale={width}:-1"
+    def preferences_get(self):
+        return {k: self.settings.get_value(k).unpack()
+                for k in self.settings.keys()}
+
+    def preparation(self, options=None, duration=0):
+        return command.preparation(
+            options or self.options, self.preferences_get(), self.file_format,
+            duration)
+
+    def output_size(self, options: dict):
+        width = options['image-width']
+        height = options['image-height']
+        if options['ratio'] and self.sources_size is not None:
+            src_width, src_height = self.sources_size
+            height = round(width * src_height / src_width)
+        return (width, height)
+
+    def job_changed(self, job):
+        if job.background:
+            if job.state not in (jobs.QUEUED, jobs.RUNNING):
+                self.proxy_done(job)
+                self.jobs_prune()
+            self.queue_show()
+            return
+        if job is self.job:
+            match job.state:
+                case jobs.DONE:
+                    self.generation_complete(job)
+                case jobs.FAILED:
+                    self.generation_failed(job)
+                case jobs.CANCELLED:
+                    self.generation_reset()
         else:
-            scale = f'scale={width}:{height}'
-
-        scaler = data.scaler[self.options['scaler']]
-        if self.settings.get_boolean('accurate-rnd'):
-            scaler += '+accurate_rnd'
-
-        uno = f"fps={self.options['fps']},{scale}:flags={scaler}"
+            match job.state:
+                case jobs.DONE:
+                    file_size = self.file_size(job.result)
+                    toast = Adw.Toast.new(
+                        title=f'{job.name}: {self.w.ts_size} {file_size}')
+                    toast.set_button_label(button_label=self.w.ts_show)
+                    toast.connect('button-clicked',
+                                  lambda _: self.toast_result_show(job))
+                    toast.connect('dismissed',
+                                  lambda _: self.toast_dismissed(job))
+                    self.toasted.add(job)
+                    self.w.overlay.add_toast(toast)
+                case jobs.FAILED:
+                    self.message_show(job.name, job.error)
+            self.jobs_prune()
+        self.queue_show()
+
+    def toast_result_show(self, job):
+        # the files may be removed by the limit of finished jobs
+        if self.scheduler.has(job):
+            self.result_show(job)
+
+    def toast_dismissed(self, job):
+        self.toasted.discard(job)
+        self.jobs_prune()
+
+    def jobs_prune(self):
+        # superseded jobs: not shown, without a toast and not being saved
+        self.scheduler.prune(self.job, self.toasted | self.saving)
+
+    def generation_complete(self, job):
+        with job.timings.measure('display'):
+            self.generation_show(job)
+        self.details_show(job)
+        self.timing_log(job)
+        directory = self.output_directory()
+        if directory and not job.draft:
+            self.save_start(job, self.save_targets(job, directory))
+
+    def generation_show(self, job):
+        outputs = job.outputs()
+        size = sum(os.path.getsize(file) for file, _, _ in outputs)
+        title = f'{self.w.ts_size} {self.size_text(size)}'
+        if len(outputs) > 1:
+            title = f'{self.w.ts_renditions.format(len(outputs))}. {title}'
+        if job.draft:
+            title = f'{self.w.ts_draft}. {title}'
+        if len(outputs) == 1 and 'mpdecimate' in job.args[0] and \
+                0 < job.frames < job.expected:
+            dropped = self.w.ts_dropped.format(
+                job.expected - job.frames, job.expected)
+            title += f', {dropped}'
+        if job.decoded is not None:
+            one, separate = job.decoded
+            title += ', ' + self.w.ts_decoded.format(
+                (separate - one) / 1000000)
+        if job.cached:
+            title += f' ({self.w.ts_cached})'
+        elif job.predicted is not None:
+            predicted = self.size_text(job.predicted)
+            title += f' ({self.w.ts_predicted.format(predicted)})'
+        self.w.overlay.add_toast(Adw.Toast(title=title, timeout=4))
+        self.result_show(job)
+
+    def generation_failed(self, job):
+        title = 'Palette error' if job.stage == 'palette' \
+            else 'Generation error'
+        self.message_show(title, job.error)
+        self.generation_reset()
+
+    def generation_reset(self):
+        self.stack_adjust_visibility('display')
+        self.switch_control(generate=True, preview=False, save=False)
+        if self.current == self.source:
+            self.trim_access(True)
 
-        if self.file_format == '.gif':
-            # palette generation
-            dither = data.dither[self.options['dither']]
-            if dither == 'bayer':
-                bs = self.settings.get_int('bayer-scale')
-                dither += ':bayer_scale=' + str(bs)
+    def job_progress(self, job):
+        if job is not self.job or job.state != jobs.RUNNING:
+            return
+        if job.stage == 'estimate':
+            self.w.progress.pulse()
+            self.w.progress.set_text(self.w.ts_estimate)
+            return
+        self.w.progress.set_fraction(job.percent / 100)
+        eta = '-' if job.eta is None else str(timedelta(seconds=int(job.eta)))
+        text = self.w.ts_progress.format(
+            int(job.percent), round(job.speed, 1), eta)
+        if job.predicted is not None:
+            predicted = self.size_text(job.predicted)
+            text += f', {self.w.ts_predicted.format(predicted)}'
+        self.w.progress.set_text(text)
+
+    def cancel_job(self, *_args):
+        if self.job is not None:
+            self.scheduler.cancel(self.job)
+
+    def result_show(self, job):
+        self.job = job
+        self.result, self.name = job.result, job.name
+        self.w.preview.set_title(
+            self.w.ts_preview_draft if job.draft else self.w.ts_preview)
+        self.current = self.result
+        active = self.w.preview.get_active()
+        self.switch_control(generate=True, preview=True, save=True)
+        if active:  # no notification
+            self.preview_switch(self.w.preview, None)
+        self.jobs_prune()
+
+    def details_show(self, job):
+        for row in self.details_rows:
+            self.w.details.remove(row)
+        stages = job.timings.records()
+        if self.probe_timings is not None:
+            stages = self.probe_timings.records() + stages
+        self.details_rows = []
+        outputs = job.outputs()
+        for file, name, r in outputs if len(outputs) > 1 else ():
+            width, height = r['size']
+            row = Adw.ActionRow(
+                title=name,
+                subtitle=f'{width}×{height}, {self.file_size(file)} MB')
+            self.w.details.add_row(row)
+            self.details_rows.append(row)
+        for stage in stages:
+            row = Adw.ActionRow(
+                title=stage['stage'], subtitle=timing.text(stage))
+            self.w.details.add_row(row)
+            self.details_rows.append(row)
+        total = sum(stage['wall'] for stage in stages)
+        self.w.details.set_subtitle(self.w.ts_total.format(total))
+        self.w.details.set_visible(True)
+
+    def timing_log(self, job, names=None):
+        # names: only these stages, for the ones added after the job
+        if not self.settings.get_boolean('timing-log'):
+            return
+        stages = job.timings.records()
+        if names is None and self.probe_timings is not None:
+            stages = self.probe_timings.records() + stages
+        if names is not None:
+            stages = [s for s in stages if s['stage'] in names]
+        try:
+            timing.log(
+                os.path.join(self.dir, 'imageflow'),
+                version=APP_VERSION,
+                source=os.path.basename(job.source),
+                format=job.file_format,
+                size=job.size,
+                duration=job.duration,
+                draft=job.draft,
+                cached=job.cached,
+                frames=job.frames,
+                stages=stages,
+            )
+        except OSError as err:
+            self.message_show(self.w.ts_timing_error, str(err))
 
-            palette = data.palette[self.settings.get_int('stats-mode')]
-            palette += f":max_colors={self.options['max-colors']}"
+    def file_size(self, path: str):
+        return self.size_text(os.path.getsize(path))
 
-            dos = f"{uno},palettegen=stats_mode={palette}"
-            tres = f"paletteuse=dither={dither}"
-        else:
-            dos, tres = None, None  # for palette only
-
-        if self.file_format == '.webp':
-            cuatro = [
-                '-c:v', 'libwebp',
-                '-lossless',
-                '1' if self.settings.get_boolean('webp-lossless') else '0',
-                '-q:v',
-                str(self.settings.get_int('webp-quality')),
-                '-preset',
-                data.webp_presets[self.settings.get_int('webp-preset')],
-                '-compression_level',
-                str(self.settings.get_int('webp-compression')),
-                '-loop', '0', '-vsync', '0', '-y',
-            ]
-        else:
-            cuatro = ['-vsync', '0', '-y']
+    def size_text(self, size: int):
+        file_size = round(size / (1024 ** 2), 1)
+        return str(file_size).replace('.', ',')
 
-        return (uno, dos, tres, cuatro)
+    def generate_wrapper(self, _, draft=False):
+        self.options_save()
+        options = self.options
+        # several segments are generated in one pass with the main options
+        segments = self.segments if self.enable_trim and not draft else []
+        entries = []
+        if not draft and not segments:
+            try:
+                entries = rendition.parse(
+                    self.settings.get_string('renditions'))
+            except ValueError as err:
+                self.message_show(self.w.ts_rendition_error, str(err))
+                return
+        if draft:
+            options = command.draft(options, self.preferences_get())
 
-    def generate(self, uno, dos, tres, cuatro):
         if self.enable_trim:
-            src = [*self.segment_range_get(), '-i', self.source]
+            start, end = self.segment_value_start, self.segment_value_end
         else:
-            src = ['-i', self.source,]
-
-        cmd = ['ffmpeg', '-v', 'error', *src, '-an']
+            start, end = 0, self.duration
+        limit = self.settings.get_int('draft-duration') * 1000000
+        if draft and limit > 0 and end - start > limit:
+            end = start + limit
+        src, trim = command.seek(
+            self.source, start, end, self.duration,
+            self.meta.get('keyframes', []))
+        args = self.preparation(options, end - start)
+
+        size = self.output_size(options)
+        target = None
+        budget = self.settings.get_double('target-size')
+        if not draft and not entries and not segments and budget > 0:
+            target = {
+                'budget': int(budget * 1024 ** 2),
+                'options': dict(options, **{'image-height': size[1]}),
+                'settings': self.preferences_get(),
+                'start': start,
+                'end': end,
+            }
+        spans = ()
+        if self.settings.get_boolean('parallel') and \
+                self.file_format in parallel.FORMATS:
+            spans = parallel.spans(
+                start, end, self.meta.get('keyframes', []),
+                self.scheduler.cores // jobs.weight(size), options['fps'],
+            )
 
-        if self.file_format == '.gif':
-            # palette
-            result = subprocess.run([
-                'ffmpeg', '-v', 'error', *src,
-                '-vf', dos, '-y', self.palette,
-            ], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-            if result.returncode != 0:
-                err = result.stderr.decode('utf-8').strip()
-                self.message_show('Palette error', err)
-                self.result = ''
-                return
-            cmd.extend((
-                '-i', self.palette,
-                '-filter_complex', f'{uno} [x]; [x][1:v] {tres}',
-                *cuatro, self.result,
-            ))
+        # with an output folder, ffmpeg writes on its file system
+        root = self.output_directory()
+        if draft or not root:
+            root = self.scheduler.root
+
+        # a newer request: the draft in progress is stale, a full
+        # conversion goes on in the queue
+        if self.job is not None and self.job.draft:
+            self.scheduler.cancel(self.job)
+
+        if segments:
+            keyframes = self.meta.get('keyframes', [])
+            src, renditions, lengths = segment.prepare(
+                self.source, segments,
+                [self.preparation(options, last - first)
+                 for first, last in segments],
+                self.file_format, size, keyframes)
+            self.job = jobs.Renditions(
+                root, self.source, src, renditions, max(lengths),
+                single_pass=self.settings.get_boolean('single-pass'),
+            )
+            self.job.decoded = (
+                sum(lengths), segment.separate(segments, keyframes))
+        elif entries:
+            # one decode for all outputs, the options are the defaults
+            renditions = rendition.prepare(
+                entries, options, self.preferences_get(),
+                self.sources_size or size, end - start)
+            self.job = jobs.Renditions(
+                root, self.source, src, renditions, end - start,
+                single_pass=self.settings.get_boolean('single-pass'),
+                trim=trim,
+            )
         else:
-            cmd.extend(('-vf', uno, *cuatro, self.result))
-
-        # conversion
-        result = subprocess.run(
-            cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-        if result.returncode != 0:
-            err = result.stderr.decode('utf-8').strip()
-            self.message_show('Generation error', err)
-            self.result = ''
-            return
-
-        GLib.idle_add(self.generation_complete)
-
-    def generation_complete(self):
-        basename = os.path.splitext(os.path.basename(self.source))[0]
-        self.name = basename + self.file_format
-
-        file_size = round(os.path.getsize(self.result) / (1024 ** 2), 1)
-        file_size = str(file_size).replace('.', ',')
-        self.w.overlay.add_toast(Adw.Toast(
-            title=f'{self.w.ts_size} {file_size}',
-            timeout=4,
-        ))
-
-        self.w.video.set_filename(self.result)
-        self.current = self.result
-        self.switch_control(generate=True, preview=True, save=True)
-
-    def generate_wrapper(self, _):
-        self.switch_control(generate=False, preview=False, save=False)
+            self.job = jobs.Job(
+                root, self.source, src, args, self.file_format,
+                size, end - start,
+                single_pass=self.settings.get_boolean('single-pass'),
+                palettes=self.palettes,
+                results=self.results,
+                draft=draft,
+                spans=spans,
+                target=target,
+                trim=trim,
+                engine=self.engine(),
+                budget=self.settings.get_int('palette-budget') * 1000,
+            )
+        self.result = ''
+        self.switch_control(generate=True, preview=False, save=False)
         self.trim_access(False)
+        self.jobs_prune()
+        # the result is copied by the scheduler, not on the main loop
+        self.job.restoring = self.job.restorable()
+        self.w.details.set_visible(False)
+        self.w.progress.set_fraction(0)
+        self.w.progress.set_text('')
         self.stack_adjust_visibility('spinner')
-        self.options_save()
-        args = self.preparation()
-        thread = threading.Thread(target=self.generate, args=args, daemon=True)
-        thread.start()
+        self.scheduler.submit(self.job)
 
     # --------------------------------------------------------------------------
 
@@ -743,12 +1283,61 @@ class ImageFlowApplication(Adw.Application):
             self.settings.get_int('theme'))
         self.w.detect_size.set_active(
             self.settings.get_boolean('detect-size'))
+        self.w.proxy.set_active(
+            self.settings.get_boolean('proxy'))
+        self.output_directory_set(
+            None, self.settings.get_string('output-directory'))
         self.w.accurate_rnd.set_active(
             self.settings.get_boolean('accurate-rnd'))
         self.w.stats_mode.set_selected(
             self.settings.get_int('stats-mode'))
+        self.w.palette_sampling.set_selected(
+            self.settings.get_int('palette-sampling'))
+        self.w.palette_sampling_value.set_value(
+            self.settings.get_int('palette-sampling-value'))
+        self.w.palette_budget.set_value(
+            self.settings.get_int('palette-budget'))
+        if not quantize.available():
+            self.w.palette_budget.set_subtitle(self.w.ts_numpy_missing)
+        level = self.settings.get_int('optimize')
+        if self.file_format == '.gif':
+            self.w.optimize.set_model(self.optimize_gif)
+            level = min(1, level)
+        else:
+            self.w.optimize.set_model(self.optimize_levels)
+        self.w.optimize.set_selected(level)
+        self.w.decimate.set_active(
+            self.settings.get_boolean('decimate'))
+        self.w.decimate_threshold.set_value(
+            self.settings.get_int('decimate-threshold'))
         self.w.bayer_scale.set_value(
             self.settings.get_int('bayer-scale'))
+        self.w.engine.set_selected(
+            self.settings.get_int('engine'))
+        if backend.PYAV is None:
+            self.w.engine.set_subtitle(self.w.ts_engine_missing)
+        self.w.single_pass.set_active(
+            self.settings.get_boolean('single-pass'))
+        self.w.parallel.set_active(
+            self.settings.get_boolean('parallel'))
+        self.w.renditions.set_text(
+            self.settings.get_string('renditions'))
+        self.w.draft_live.set_active(
+            self.settings.get_boolean('draft-live'))
+        self.w.draft_width.set_value(
+            self.settings.get_int('draft-width'))
+        self.w.draft_fps.set_value(
+            self.settings.get_int('draft-fps'))
+        self.w.draft_duration.set_value(
+            self.settings.get_int('draft-duration'))
+        self.w.result_cache.set_value(
+            self.settings.get_int('result-cache'))
+        self.w.result_cache.set_subtitle(self.w.ts_cache_stats.format(
+            self.results.hits, self.results.misses))
+        self.w.target_size.set_value(
+            self.settings.get_double('target-size'))
+        self.w.timing_log.set_active(
+            self.settings.get_boolean('timing-log'))
         self.w.webp_lossless.set_active(
             self.settings.get_boolean('webp-lossless'))
         self.w.webp_quality.set_value(
@@ -765,12 +1354,54 @@ class ImageFlowApplication(Adw.Application):
             'theme', self.w.pref_theme.get_selected())
         self.settings.set_boolean(
             'detect-size', self.w.detect_size.get_active())
+        self.settings.set_boolean(
+            'proxy', self.w.proxy.get_active())
         self.settings.set_boolean(
             'accurate-rnd', self.w.accurate_rnd.get_active())
         self.settings.set_int(
             'stats-mode', int(self.w.stats_mode.get_selected()))
+        self.settings.set_int(
+            'palette-sampling', int(self.w.palette_sampling.get_selected()))
+        self.settings.set_int(
+            'palette-sampling-value',
+            int(self.w.palette_sampling_value.get_value()))
+        self.settings.set_int(
+            'palette-budget', int(self.w.palette_budget.get_value()))
+        level = int(self.w.optimize.get_selected())
+        if self.w.optimize.get_model() is self.optimize_gif and level:
+            # the WebP level stays
+            level = max(level, self.settings.get_int('optimize'))
+        self.settings.set_int('optimize', level)
+        self.settings.set_boolean(
+            'decimate', self.w.decimate.get_active())
+        self.settings.set_int(
+            'decimate-threshold', int(self.w.decimate_threshold.get_value()))
         self.settings.set_int(
             'bayer-scale', int(self.w.bayer_scale.get_value()))
+        self.settings.set_int(
+            'engine', int(self.w.engine.get_selected()))
+        self.settings.set_boolean(
+            'single-pass', self.w.single_pass.get_active())
+        self.settings.set_boolean(
+            'parallel', self.w.parallel.get_active())
+        self.settings.set_string(
+            'renditions', self.w.renditions.get_text().strip())
+        self.settings.set_boolean(
+            'draft-live', self.w.draft_live.get_active())
+        self.settings.set_int(
+            'draft-width', int(self.w.draft_width.get_value()))
+        self.settings.set_int(
+            'draft-fps', int(self.w.draft_fps.get_value()))
+        self.settings.set_int(
+            'draft-duration', int(self.w.draft_duration.get_value()))
+        self.settings.set_int(
+            'result-cache', int(self.w.result_cache.get_value()))
+        self.results.limit = self.settings.get_int('result-cache') * cache.MB
+        self.results.evict()
+        self.settings.set_boolean(
+            'timing-log', self.w.timing_log.get_active())
+        self.settings.set_double(
+            'target-size', self.w.target_size.get_value())
         self.settings.set_boolean(
             'webp-lossless', self.w.webp_lossless.get_active())
         self.settings.set_int(
@@ -780,6 +1411,26 @@ class ImageFlowApplication(Adw.Application):
         self.settings.set_int(
             'webp-compression', int(self.w.webp_compression.get_value()))
 
+    def output_directory_choose(self, _button):
+        def output_directory_finish(dialog, result):
+            try:
+                folder = dialog.select_folder_finish(result)
+                if folder:
+                    self.output_directory_set(None, folder.get_path())
+            except Exception as err:
+                err = str(err)
+                if 'dismissed by user' not in err.lower():
+                    self.message_show('Folder error', err)
+
+        dialog = Gtk.FileDialog.new()
+        dialog.set_title('Output folder')
+        dialog.select_folder(self.w, None, output_directory_finish)
+
+    def output_directory_set(self, _button, path: str):
+        self.settings.set_string('output-directory', path)
+        self.w.output_directory.set_subtitle(
+            GLib.markup_escape_text(path) if path else self.w.ts_output_none)
+
     def theme_change(self, widget, _):
         self.update_theme(widget.get_selected())
 
@@ -812,12 +1463,11 @@ class ImageFlowApplication(Adw.Application):
 
     def do_shutdown(self):
         # deleting temporary files
-        if self.palette != '' and os.path.exists(self.palette):
-            os.remove(self.palette)
-        for i in data.format:
-            file = os.path.join(self.dir, TMP_NAME + i)
-            if os.path.exists(file):
-                os.remove(file)
+        if self.live_timer is not None:
+            GLib.source_remove(self.live_timer)
+        self.player.stop()
+        self.scheduler.cleanup()
+        self.proxy_reset()
         # shutdown
         Gio.Application.do_shutdown(self)
 
@@ -0,0 +1,101 @@
+# parallel.py
+#
+# Copyright 2026 Golodnikov Sergey
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty
+# of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+
+# time-chunked encoding: the range is split into chunks that are encoded
+# by separate ffmpeg processes and joined without re-encoding; GIF only,
+# the WebP frames would have to be encoded again by one libwebp process,
+# which is most of the time; time values are in microseconds
+
+import os
+
+from .command import seconds
+
+
+MIN_CHUNK = 2000000
+FORMATS = ('.gif',)
+
+
+def grid(position: float, start: int, fps: float):
+    # the closest output frame boundary, counted from the start
+    frame = 1000000 / fps
+    return start + round(round((position - start) / frame) * frame)
+
+
+def spans(start: int, end: int, keyframes: list, count: int, fps: float):
+    # chunk edges at the keyframes closest to an even split,
+    # moved to the output frame grid
+    length = end - start
+    if count < 2 or fps <= 0 or length < 2 * MIN_CHUNK:
+        return [(start, end)]
+    inner = [k for k in keyframes
+             if start + MIN_CHUNK <= k <= end - MIN_CHUNK]
+    edges = [start]
+    for i in range(1, count):
+        target = start + length * i / count
+        if inner:
+            target = min(inner, key=lambda k: abs(k - target))
+        edge = grid(target, start, fps)
+        if edge - edges[-1] >= MIN_CHUNK and end - edge >= MIN_CHUNK:
+            edges.append(edge)
+    edges.append(end)
+    return list(zip(edges, edges[1:]))
+
+
+def regrid(chunks: list, fps: float):
+    # the same chunks on the frame grid of another frame rate
+    # (the target size search can change it)
+    start, end = chunks[0][0], chunks[-1][1]
+    edges = [start]
+    for _, edge in chunks[:-1]:
+        edge = grid(edge, start, fps)
+        if edges[-1] < edge < end:
+            edges.append(edge)
+    edges.append(end)
+    return list(zip(edges, edges[1:]))
+
+
+def steps(source: str, chunks: list, args: tuple, palette: str,
+          workspace: str, result: str):
+    # the chunks use the palette of the whole range
+    uno, _dos, tres, cuatro = args
+
+    encode, files = [], []
+    for i, (start, end) in enumerate(chunks):
+        file = os.path.join(workspace, f'chunk-{i:03d}.gif')
+        cmd = [
+            'ffmpeg', '-v', 'error',
+            '-ss', seconds(start), '-to', seconds(end), '-i', source, '-an',
+            '-i', palette,
+            '-filter_complex', f'{uno} [x]; [x][1:v] {tres}',
+            *cuatro, file,
+        ]
+        encode.append((cmd, end - start))
+        files.append(file)
+
+    concat = os.path.join(workspace, 'chunks.txt')
+    with open(concat, 'w', encoding='utf-8') as f:
+        for file in files:
+            f.write(f"file '{os.path.basename(file)}'\n")
+
+    join = ['ffmpeg', '-v', 'error', '-f', 'concat', '-safe', '0',
+            '-i', concat, '-c', 'copy', '-y', result]
+
+    total = chunks[-1][1] - chunks[0][0]
+    return [('chunks', encode), ('join', [(join, total)])]
@@ -0,0 +1,172 @@
+# player.py
+#
+# Copyright 2026 Golodnikov Sergey
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty
+# of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+
+# GIF and WebP playback in a Gtk.Picture with the delays of the file,
+# the frames come from animation.Decoder and are kept as textures in
+# animation.Frames; a frame that is not decoded yet holds the playback
+
+from gi.repository import Gdk, GLib
+
+from . import animation
+
+
+class Player:
+    def __init__(self, picture, failed=None):
+        self.picture = picture
+        self.failed = failed  # callback(path, error)
+        self.path = ''
+        self.info = None  # (width, height, delays)
+        self.frames = animation.Frames()
+        self.decoder = None
+        self.index = 0
+        self.waiting = None  # index of the frame to show when decoded
+        self.timer = None
+        self.loop = True
+        self.paused = False
+
+    @property
+    def active(self):
+        return self.info is not None
+
+    def load(self, path: str, loop: bool):
+        # False if the file cannot be played, the caller shows it otherwise
+        self.stop()
+        try:
+            self.info = animation.scan(path)
+        except (OSError, animation.AnimationError):
+            return False
+        if not self.info[2]:
+            self.info = None
+            return False
+        self.path, self.loop, self.paused = path, loop, False
+        self.show(0)
+        return True
+
+    def stop(self):
+        if self.timer is not None:
+            GLib.source_remove(self.timer)
+            self.timer = None
+        if self.decoder is not None:
+            self.decoder.stop()
+            self.decoder = None
+        self.frames.clear()
+        self.picture.set_paintable(None)
+        self.path, self.info = '', None
+        self.index, self.waiting = 0, None
+
+    def set_loop(self, loop: bool):
+        self.loop = loop
+        # the last frame was shown, start again
+        if loop and self.info is not None and self.timer is None and \
+                self.waiting is None and not self.paused:
+            self.show(0)
+
+    def toggle(self):
+        if self.info is None:
+            return
+        self.paused = not self.paused
+        if self.paused:
+            if self.timer is not None:
+                GLib.source_remove(self.timer)
+                self.timer = None
+        elif self.waiting is None:
+            self.advance()
+
+    # --------------------------------------------------------------------------
+
+    def decode(self, first: int):
+        # a new decoder from the frame, the old one is too far
+        if self.decoder is not None:
+            self.decoder.stop()
+        width, height, _ = self.info
+        size = width * height * 4
+        # half of the memory for the frames ahead of the playback
+        ahead = self.frames.limit // size // 2
+        self.decoder = animation.Decoder(
+            self.path, width, height, first, ahead,
+            self.decoded, self.decoder_finished)
+
+    def show(self, index: int):
+        self.index = index
+        texture = self.frames.get(index)
+        if texture is None:
+            self.waiting = index
+            d = self.decoder
+            if d is None or d.done or d.next > index:
+                self.decode(index)
+            else:
+                d.seek(index)
+            return
+        self.waiting = None
+        if self.decoder is not None:
+            self.decoder.seek(index)
+        self.picture.set_paintable(texture)
+        delays = self.info[2]
+        if len(delays) > 1 and not self.paused:
+            self.timer = GLib.timeout_add(delays[index], self.tick)
+
+    def tick(self):
+        self.timer = None
+        self.advance()
+        return False
+
+    def advance(self):
+        index = self.index + 1
+        if index == len(self.info[2]):
+            if not self.loop:
+                return
+            index = 0
+        self.show(index)
+
+    # --------------------------------------------------------------------------
+
+    def decoded(self, decoder, index: int, data: bytes):
+        # decoder thread
+        GLib.idle_add(self.frame_add, decoder, index, data)
+
+    def frame_add(self, decoder, index: int, data: bytes):
+        if decoder is not self.decoder:
+            return False
+        width, height, _ = self.info
+        texture = Gdk.MemoryTexture.new(
+            width, height, Gdk.MemoryFormat.R8G8B8A8,
+            GLib.Bytes.new(data), width * 4)
+        self.frames.put(index, texture, len(data))
+        if index == self.waiting:
+            self.show(index)
+        return False
+
+    def decoder_finished(self, decoder, error):
+        # decoder thread
+        GLib.idle_add(self.decoder_done, decoder, error)
+
+    def decoder_done(self, decoder, error):
+        if decoder is not self.decoder:
+            return False
+        if error is not None:
+            path = self.path
+            self.stop()
+            if self.failed is not None:
+                self.failed(path, error)
+        elif self.waiting is not None and self.waiting >= decoder.next:
+            # fewer frames than in the header: the last decoded one
+            self.info = (*self.info[:2], self.info[2][:decoder.next])
+            self.show(decoder.next - 1)
+        return False
@@ -0,0 +1,176 @@
+# probe.py
+#
+# Copyright 2026 Golodnikov Sergey
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty
+# of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+
+# source analysis with ffprobe, the persistent metadata cache and the
+# keyframe index, time values are in microseconds from the file start
+
+from fractions import Fraction
+import json
+import os
+import tempfile
+import threading
+
+from . import cache, child
+
+
+METADATA_LIMIT = 1000  # entries
+INDEX_LIMIT = 32 * cache.MB
+
+
+class ProbeError(Exception):
+    pass
+
+
+def ffprobe(*args, usages=None):
+    # usages: list for the resource usage of the process
+    process = child.run(['ffprobe', '-v', 'error', *args], collect=True)
+    if usages is not None:
+        usages.append(process.usage)
+    if process.returncode != 0:
+        raise ProbeError(process.error)
+    return process.output.decode('utf-8')
+
+
+def info(path: str, usages=None):
+    # stream parameters, fast: only the headers are read
+    output = ffprobe(
+        '-select_streams', 'v:0',
+        '-show_entries',
+        'stream=width,height,codec_name,avg_frame_rate,nb_frames',
+        '-show_entries', 'format=duration,start_time',
+        '-of', 'json', path, usages=usages,
+    )
+    try:
+        parsed = json.loads(output)
+        stream = parsed['streams'][0]
+    except (ValueError, KeyError, IndexError) as err:
+        raise ProbeError(f'Unexpected ffprobe output: {err}')
+
+    try:
+        duration = float(parsed.get('format', {}).get('duration', ''))
+    except ValueError:
+        duration = 0.0  # unknown, e.g. a live stream dump
+
+    try:
+        start = float(parsed.get('format', {}).get('start_time', ''))
+    except ValueError:
+        start = 0.0
+
+    try:
+        fps = float(Fraction(stream.get('avg_frame_rate', '0/1')))
+    except (ValueError, ZeroDivisionError):
+        fps = 0.0
+    frames = stream.get('nb_frames', '')
+
+    return {
+        'duration': round(duration * 1000000),
+        'start': round(start * 1000000),
+        'width': stream.get('width', 0),
+        'height': stream.get('height', 0),
+        'fps': fps,
+        'codec': stream.get('codec_name', ''),
+        'frames': int(frames) if frames.isdigit() else 0,
+    }
+
+
+def keyframes(path: str, start=0, usages=None):
+    # packet scan, reads the whole file but does not decode it;
+    # start: the start time of the file, -ss positions are relative to it
+    output = ffprobe(
+        '-select_streams', 'v:0',
+        '-show_entries', 'packet=pts_time,flags',
+        '-of', 'csv=p=0', path, usages=usages,
+    )
+    positions, packets = [], 0
+    for line in output.splitlines():
+        pts_time, _, flags = line.partition(',')
+        if not flags:
+            continue
+        packets += 1
+        if 'K' in flags:
+            try:
+                positions.append(round(float(pts_time) * 1000000) - start)
+            except ValueError:
+                continue
+    return sorted(positions), packets
+
+
+class Index:
+    # keyframe positions and the packet count, one file per source,
+    # larger than the metadata and read only when needed
+    def __init__(self, root: str):
+        self.files = cache.Cache(root, INDEX_LIMIT, '.json')
+
+    def get(self, key: str):
+        path = self.files.get(cache.key(key))
+        if path is None:
+            return None
+        try:
+            with open(path, encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def set(self, key: str, value: dict):
+        fd, tmp = tempfile.mkstemp(dir=self.files.root, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(value, f)
+            self.files.put(cache.key(key), tmp)
+        finally:
+            os.remove(tmp)
+
+
+class Metadata:
+    def __init__(self, file: str):
+        self.file = file
+        self.lock = threading.Lock()
+        try:
+            with open(self.file, encoding='utf-8') as f:
+                self.entries = json.load(f)
+        except (OSError, ValueError):
+            self.entries = {}
+
+    def get(self, key: str):
+        with self.lock:
+            value = self.entries.pop(key, None)
+            if value is not None:
+                self.entries[key] = value  # most recent at the end
+            return value
+
+    def set(self, key: str, value: dict):
+        with self.lock:
+            self.entries.pop(key, None)
+            self.entries[key] = value
+            while len(self.entries) > METADATA_LIMIT:
+                self.entries.pop(next(iter(self.entries)))
+            self.save()
+
+    def save(self):
+        directory = os.path.dirname(self.file)
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(self.entries, f)
+            os.replace(tmp, self.file)
+        except OSError:
+            if os.path.exists(tmp):
+                os.remove(tmp)
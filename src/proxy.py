@@ -0,0 +1,52 @@
+# proxy.py
+#
+# Copyright 2026 Golodnikov Sergey
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty
+# of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+
+# low resolution copies of large sources for the preview: every frame is
+# a keyframe (MJPEG), so seeking does not decode, the timestamps and the
+# audio are the same as in the source
+
+from . import cache
+
+
+PROXY_LIMIT = 2048 * cache.MB
+PROXY_WIDTH = 960
+
+# sources above this size get a proxy
+THRESHOLD = 1920 * 1080
+
+
+def needed(width: int, height: int):
+    return width * height > THRESHOLD
+
+
+def key(source: str):
+    return cache.key(cache.fingerprint(source), PROXY_WIDTH)
+
+
+def command(source: str, path: str):
+    return [
+        'ffmpeg', '-v', 'error', '-i', source,
+        '-map', '0:v:0', '-map', '0:a:0?',
+        '-vf', f'scale={PROXY_WIDTH}:-2',
+        '-c:v', 'mjpeg', '-q:v', '5', '-pix_fmt', 'yuvj420p',
+        '-c:a', 'copy', '-vsync', '0',
+        '-f', 'matroska', '-y', path,
+    ]
+
@@ -0,0 +1,209 @@
+# quantize.py
+#
+# Copyright 2026 Golodnikov Sergey
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty
+# of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+
+# palette from a pixel budget with NumPy, instead of palettegen: ffmpeg
+# gives downscaled rawvideo frames over a pipe (see pipe()), the colors
+# are reduced by median cut and refined by k-means; the result is a 16x16
+# palette image for paletteuse, like the one of palettegen;
+# must not import Gtk/Adw
+
+import math
+import re
+import struct
+import zlib
+
+from .command import frame_rate, palettegen
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+MIN_FRAME = 64 * 64  # pixels of a sampled frame
+ITERATIONS = 4  # k-means
+CHUNK = 65536  # colors per distance matrix
+TRANSPARENT = (0, 255, 0, 0)  # the color palettegen reserves
+
+
+class QuantizeError(Exception):
+    pass
+
+
+def available():
+    return numpy is not None
+
+
+def pipe(src: list, args: tuple, size: tuple, duration: int, budget: int,
+         trim=''):
+    # ffmpeg command: the frames palettegen would see (the sampling of
+    # the settings included), fewer and smaller to fit the budget; the
+    # frames are selected after fps and scaled once, straight to the
+    # budget size instead of the output size
+    fps, _, rest = args[0].partition(',')
+    after = rest.partition(',')[2]  # mpdecimate
+    select = palettegen(args).rpartition('palettegen')[0]
+    frames = duration / 1000000 * frame_rate(args)
+    found = re.search(r'mod\(n\\,(\d+)\)', select)
+    if found:
+        frames /= int(found.group(1))
+    # scene changes: counted as all frames, the budget is an upper bound
+    frames = max(1.0, frames)
+    per_frame = budget / frames
+    if per_frame < MIN_FRAME and not select:
+        step = math.ceil(MIN_FRAME * frames / budget)
+        select = f"select='not(mod(n\\,{step}))',"
+        per_frame = MIN_FRAME
+    scale = min(1.0, math.sqrt(max(per_frame, MIN_FRAME) /
+                               (size[0] * size[1])))
+    # the height follows the ratio, the size may be a guess (batch mode)
+    width = max(2, round(size[0] * scale))
+    filters = f'{fps},{select}scale={width}:-2:flags=area'
+    if after:
+        filters += f',{after}'
+    filters += ',format=rgb24'
+    if trim:
+        filters = f'{trim},{filters}'
+    return [
+        'ffmpeg', '-v', 'error', *src, '-an', '-vf', filters,
+        '-f', 'rawvideo', '-vsync', '0', '-',
+    ]
+
+
+def histogram(pixels):
+    # unique colors and their counts
+    packed = (pixels[:, 0].astype(numpy.uint32) << 16) | \
+        (pixels[:, 1].astype(numpy.uint32) << 8) | pixels[:, 2]
+    values, counts = numpy.unique(packed, return_counts=True)
+    colors = numpy.stack(
+        ((values >> 16) & 255, (values >> 8) & 255, values & 255), axis=1)
+    return colors.astype(numpy.float32), counts.astype(numpy.float32)
+
+
+def median_cut(colors, weights, count: int):
+    # boxes are split at the weighted median of the widest channel,
+    # the box with the largest weighted range first
+    def score(box):
+        if len(box) < 2:
+            return 0.0
+        ranges = numpy.ptp(colors[box], axis=0)
+        return float(ranges.max()) * float(weights[box].sum())
+
+    boxes = [numpy.arange(len(colors))]
+    scores = [score(boxes[0])]
+    while len(boxes) < count:
+        best = max(range(len(boxes)), key=scores.__getitem__)
+        if scores[best] == 0:
+            break
+        box = boxes.pop(best)
+        scores.pop(best)
+        channel = int(numpy.ptp(colors[box], axis=0).argmax())
+        order = box[numpy.argsort(colors[box, channel], kind='stable')]
+        cumulative = numpy.cumsum(weights[order])
+        cut = int(numpy.searchsorted(cumulative, cumulative[-1] / 2))
+        cut = min(max(cut, 1), len(order) - 1)
+        for part in (order[:cut], order[cut:]):
+            boxes.append(part)
+            scores.append(score(part))
+    return numpy.stack([
+        numpy.average(colors[box], axis=0, weights=weights[box])
+        for box in boxes])
+
+
+def nearest(colors, centers):
+    # index of the closest center, |a - b|² = |a|² - 2ab + |b|²
+    found = numpy.empty(len(colors), dtype=numpy.intp)
+    norms = (centers ** 2).sum(axis=1)
+    for i in range(0, len(colors), CHUNK):
+        part = colors[i:i + CHUNK]
+        distances = norms - 2 * part @ centers.T
+        found[i:i + CHUNK] = distances.argmin(axis=1)
+    return found
+
+
+def kmeans(colors, weights, centers, iterations=ITERATIONS):
+    for _ in range(iterations):
+        labels = nearest(colors, centers)
+        totals = numpy.bincount(labels, weights, minlength=len(centers))
+        used = totals > 0
+        for channel in range(3):
+            sums = numpy.bincount(
+                labels, weights * colors[:, channel], minlength=len(centers))
+            centers[used, channel] = sums[used] / totals[used]
+    return centers
+
+
+def quantize(pixels, max_colors: int):
+    # (n, 3) uint8 pixels to at most max_colors (r, g, b)
+    colors, weights = histogram(pixels)
+    if len(colors) <= max_colors:
+        return colors.astype(numpy.uint8)
+    centers = median_cut(colors, weights, max_colors)
+    centers = kmeans(colors, weights, centers)
+    return numpy.clip(numpy.rint(centers), 0, 255).astype(numpy.uint8)
+
+
+def png(path: str, rgba: bytes, width: int, height: int):
+    # 8 bit RGBA, no filtering
+    def block(kind: bytes, data: bytes):
+        return struct.pack('>I', len(data)) + kind + data + \
+            struct.pack('>I', zlib.crc32(kind + data))
+
+    stride = width * 4
+    raw = b''.join(b'\0' + rgba[y * stride:(y + 1) * stride]
+                   for y in range(height))
+    with open(path, 'wb') as f:
+        f.write(b'\x89PNG\r\n\x1a\n')
+        f.write(block(b'IHDR', struct.pack(
+            '>IIBBBBB', width, height, 8, 6, 0, 0, 0)))
+        f.write(block(b'IDAT', zlib.compress(raw, 9)))
+        f.write(block(b'IEND', b''))
+
+
+def palette(output: bytes, args: tuple, budget: int, path: str):
+    # writes the palette image from the rawvideo of pipe(),
+    # returns the number of sampled pixels
+    if numpy is None:
+        raise QuantizeError('NumPy is not installed')
+    pixels = numpy.frombuffer(output, dtype=numpy.uint8)
+    pixels = pixels[:len(pixels) // 3 * 3].reshape(-1, 3)
+    if len(pixels) == 0:
+        raise QuantizeError('No frames in the range')
+    if len(pixels) > budget:
+        # evenly spaced, the same result for the same input
+        pixels = pixels[numpy.linspace(
+            0, len(pixels) - 1, budget).astype(numpy.intp)]
+
+    dos = args[1]
+    found = re.search(r'max_colors=(\d+)', dos)
+    max_colors = int(found.group(1)) if found else 256
+    # on by default in palettegen
+    reserve = 'reserve_transparent=0' not in dos
+    if reserve:
+        max_colors = min(max_colors, 255)
+    colors = quantize(pixels, max_colors)
+
+    # 256 entries, the unused ones repeat the first color
+    entries = [(*map(int, c), 255) for c in colors]
+    entries += [entries[0]] * (256 - len(entries) - reserve)
+    if reserve:
+        entries.append(TRANSPARENT)
+    png(path, bytes(v for e in entries for v in e), 16, 16)
+    return len(pixels)
@@ -0,0 +1,185 @@
+# rendition.py
+#
+# Copyright 2026 Golodnikov Sergey
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty
+# of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+
+# rendition sets: several outputs from one decode of the source, the
+# decoded stream is split and every branch has its own filters, palette
+# and encoder options; must not import Gtk/Adw
+#
+# a set is written as entries separated by commas or spaces,
+# FORMAT:SIZE[@FPS][:KEY=VALUE...], the size is the width or the height
+# with "p", e.g. "gif:480p gif:720p@12 webp:1080p:q=80";
+# keys: dither (GIF), colors (GIF), q (WebP quality)
+
+import re
+
+from . import command, data
+
+
+ENTRY = re.compile(r'(gif|webp):(\d+)(p?)(?:@(\d+))?((?::\w+=[\w.]+)*)$')
+MAX_SIZE = 8192
+
+
+def parse(text: str):
+    # list of entries, ValueError for a wrong one
+    entries = []
+    for item in re.split(r'[,\s]+', text.strip()):
+        if not item:
+            continue
+        match = ENTRY.match(item.lower())
+        if match is None:
+            raise ValueError(f'wrong rendition: {item}')
+        file_format, size, height, fps, keys = match.groups()
+        entry = {
+            'format': '.' + file_format,
+            'size': int(size),
+            'height': height == 'p',
+            'fps': int(fps) if fps else None,
+        }
+        if not 2 <= entry['size'] <= MAX_SIZE or entry['fps'] == 0:
+            raise ValueError(f'wrong rendition: {item}')
+        # an option of the other format is an error too
+        gif = file_format == 'gif'
+        for pair in filter(None, keys.split(':')):
+            key, _, value = pair.partition('=')
+            match key:
+                case 'dither' if gif and value in data.dither:
+                    entry['dither'] = data.dither.index(value)
+                case 'colors' if gif and value.isdigit() and \
+                        2 <= int(value) <= 256:
+                    entry['max-colors'] = int(value)
+                case 'q' if not gif and value.isdigit() and \
+                        int(value) <= 100:
+                    entry['webp-quality'] = int(value)
+                case _:
+                    raise ValueError(f'wrong rendition option: {pair}')
+        entries.append(entry)
+    return entries
+
+
+def prepare(entries: list, options: dict, settings: dict, source_size: tuple,
+            duration=0):
+    # options and settings of the application are the defaults,
+    # list of dicts with the filters (args), size and file suffix
+    src_width, src_height = source_size
+    renditions, suffixes = [], set()
+    for entry in entries:
+        if entry['height']:
+            height = entry['size']
+            width = round(height * src_width / src_height / 2) * 2
+        else:
+            width = entry['size']
+            height = round(width * src_height / src_width / 2) * 2
+        o = dict(options, **{
+            'image-width': width, 'image-height': height, 'ratio': False})
+        if entry['fps'] is not None:
+            o['fps'] = entry['fps']
+        s = dict(settings)
+        for key in ('dither', 'max-colors'):
+            if key in entry:
+                o[key] = entry[key]
+        if 'webp-quality' in entry:
+            s['webp-quality'] = entry['webp-quality']
+
+        suffix = f"-{entry['size']}{'p' if entry['height'] else ''}"
+        if entry['fps'] is not None:
+            suffix += f"-{entry['fps']}fps"
+        n, base = 1, suffix
+        while suffix + entry['format'] in suffixes:
+            suffix = f'{base}-{n}'
+            n += 1
+        suffixes.add(suffix + entry['format'])
+
+        renditions.append({
+            'format': entry['format'],
+            'size': (width, height),
+            'args': command.preparation(o, s, entry['format'], duration),
+            'suffix': suffix,
+        })
+    return renditions
+
+
+def branches(renditions: list, indices: list, head: str, tap: bool):
+    # one split per input, [s<i>] for every rendition of it,
+    # [t<n>] for the null output
+    graph = []
+    for n in sorted({renditions[i].get('input', 0) for i in indices}):
+        own = [i for i in indices if renditions[i].get('input', 0) == n]
+        names = ''.join(f'[s{i}]' for i in own)
+        if tap:
+            names += f'[t{n}]'
+        graph.append(f'[{n}:v] {head}split={len(own) + tap} {names}')
+    return graph
+
+
+def generate(src: list, renditions: list, results: list, palettes: list,
+             single_pass=False, trim=''):
+    # list of (stage, command) like command.generate(): one process
+    # with single_pass (the GIF branches wait for their palettes and keep
+    # the frames in memory), otherwise the palettes are made first by
+    # another process, one decode each;
+    # src can have several inputs, a rendition has the index of its
+    # input and its own trim filters, see segment.prepare()
+    gif = [i for i, r in enumerate(renditions) if r['format'] == '.gif']
+    every = list(range(len(renditions)))
+    head = f'{trim},' if trim else ''
+    steps = []
+
+    def filters(i: int, f: str):
+        own = renditions[i].get('trim', '')
+        return f'{own},{f}' if own else f
+
+    if gif and not single_pass:
+        graph = branches(renditions, gif, head, False)
+        maps = []
+        for i in gif:
+            graph.append(
+                f"[s{i}] {filters(i, renditions[i]['args'][1])} [p{i}]")
+            maps.extend(('-map', f'[p{i}]', '-y', palettes[i]))
+        steps.append(('palette', [
+            'ffmpeg', '-v', 'error', *src,
+            '-filter_complex', '; '.join(graph), *maps,
+        ]))
+
+    # the [t] branches go to a null output, for -progress while decoding
+    graph = branches(renditions, every, head, True)
+    cmd = ['ffmpeg', '-v', 'error', *src]
+    inputs = 1 + max(r.get('input', 0) for r in renditions)
+    for i, r in enumerate(renditions):
+        uno, _dos, tres, _cuatro = r['args']
+        if r['format'] != '.gif':
+            graph.append(f'[s{i}] {filters(i, uno)} [r{i}]')
+        elif single_pass:
+            palettegen = command.palettegen(r['args'])
+            graph.append(f'[s{i}] {filters(i, uno)},split [a{i}][b{i}]')
+            graph.append(f'[a{i}] {palettegen} [p{i}]')
+            graph.append(f'[b{i}][p{i}] {tres} [r{i}]')
+        else:
+            cmd.extend(('-i', palettes[i]))
+            graph.append(f'[s{i}] {filters(i, uno)} [x{i}]')
+            graph.append(f'[x{i}][{inputs}:v] {tres} [r{i}]')
+            inputs += 1
+    cmd.extend(('-filter_complex', '; '.join(graph)))
+    for i, r in enumerate(renditions):
+        cmd.extend(('-map', f'[r{i}]', *r['args'][3], results[i]))
+    for n in sorted({r.get('input', 0) for r in renditions}):
+        cmd.extend(('-map', f'[t{n}]'))
+    cmd.extend(('-f', 'null', '-'))
+    steps.append(('generation', cmd))
+    return steps
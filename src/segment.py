@@ -0,0 +1,93 @@
+# segment.py
+#
+# Copyright 2026 Golodnikov Sergey
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty
+# of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+
+# several trim ranges of one source in one ffmpeg process: ranges that
+# are close together share an input and are decoded once, a long gap
+# is skipped by another input seeked to its own keyframe;
+# the outputs are renditions with their input and trim, see rendition.py;
+# time values are in microseconds
+
+from .command import seconds
+
+
+MERGE_GAP = 10000000  # a shorter gap is decoded instead of seeked
+
+
+def keyframe(position: int, keyframes: list):
+    # where the decoding starts for a seek to the position, an accurate
+    # seek without the index is counted from the position itself
+    if not keyframes:
+        return position
+    return max((k for k in keyframes if k <= position), default=0)
+
+
+def groups(segments: list, keyframes: list, gap=MERGE_GAP):
+    # lists of segment indices in time order, one list per input
+    order = sorted(range(len(segments)), key=lambda i: segments[i])
+    found, end = [], None
+    for i in order:
+        start = segments[i][0]
+        # a new input decodes from the keyframe before the start anyway
+        base = keyframe(start, keyframes)
+        if found and base - end < gap:
+            found[-1].append(i)
+            end = max(end, segments[i][1])
+        else:
+            found.append([i])
+            end = segments[i][1]
+    return found
+
+
+def prepare(source: str, segments: list, args: list, file_format: str,
+            size: tuple, keyframes: list):
+    # input options, renditions (one per segment, named name_N)
+    # and the decoded length of every input;
+    # args: one per segment, prepared for its own length
+    src, renditions, lengths = [], [None] * len(segments), []
+    for n, indices in enumerate(groups(segments, keyframes)):
+        start = min(segments[i][0] for i in indices)
+        end = max(segments[i][1] for i in indices)
+        # the exact cuts are made by trim, see command.seek()
+        base = keyframe(start, keyframes)
+        seek = []
+        if base > 0:
+            if keyframes:
+                seek.append('-noaccurate_seek')
+            seek.extend(('-ss', seconds(base)))
+        src.extend((*seek, '-t', seconds(end - base), '-i', source))
+        lengths.append(end - base)
+        for i in indices:
+            first, last = segments[i]
+            renditions[i] = {
+                'format': file_format,
+                'size': size,
+                'args': args[i],
+                'suffix': f'_{i + 1}',
+                'input': n,
+                'trim': f'trim=start={seconds(first - base)}'
+                        f':duration={seconds(last - first)},'
+                        f'setpts=PTS-STARTPTS',
+            }
+    return src, renditions, lengths
+
+
+def separate(segments: list, keyframes: list):
+    # decoded length of the same segments as separate jobs
+    return sum(last - keyframe(first, keyframes) for first, last in segments)
@@ -0,0 +1,107 @@
+# timing.py
+#
+# Copyright 2026 Golodnikov Sergey
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty
+# of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+
+# per-stage wall time, CPU time and peak memory, for the child processes
+# (wait4) and for the work done in the application itself
+
+from contextlib import contextmanager
+import json
+import os
+import resource
+import threading
+import time
+
+
+LOG_NAME = 'timing.jsonl'
+
+# the calling thread only, where it is supported
+RUSAGE = getattr(resource, 'RUSAGE_THREAD', resource.RUSAGE_SELF)
+
+
+def wait(process):
+    # Popen.wait() with the resource usage of the child,
+    # None if the process was already reaped elsewhere
+    try:
+        _pid, status, usage = os.wait4(process.pid, 0)
+    except ChildProcessError:
+        process.wait()
+        return None
+    process.returncode = os.waitstatus_to_exitcode(status)
+    return usage
+
+
+class Timings:
+    def __init__(self):
+        self.stages = []
+        self.lock = threading.Lock()
+
+    def add(self, name: str, wall: float, cpu=None, rss=None):
+        # seconds, seconds, bytes
+        with self.lock:
+            self.stages.append(
+                {'stage': name, 'wall': wall, 'cpu': cpu, 'rss': rss})
+
+    def children(self, name: str, wall: float, usages: list):
+        # processes that ran at the same time: CPU time adds up,
+        # the peak memory is the largest one (kilobytes on Linux)
+        usages = [u for u in usages if u is not None]
+        if not usages:
+            self.add(name, wall)
+            return
+        self.add(name, wall,
+                 sum(u.ru_utime + u.ru_stime for u in usages),
+                 max(u.ru_maxrss for u in usages) * 1024)
+
+    @contextmanager
+    def measure(self, name: str):
+        start, before = time.monotonic(), resource.getrusage(RUSAGE)
+        try:
+            yield
+        finally:
+            after = resource.getrusage(RUSAGE)
+            cpu = (after.ru_utime - before.ru_utime) + \
+                (after.ru_stime - before.ru_stime)
+            self.add(name, time.monotonic() - start, cpu,
+                     after.ru_maxrss * 1024)
+
+    def total(self):
+        with self.lock:
+            return sum(s['wall'] for s in self.stages)
+
+    def records(self):
+        with self.lock:
+            return [dict(s) for s in self.stages]
+
+
+def text(stage: dict):
+    parts = [f"{stage['wall']:.2f} s"]
+    if stage['cpu'] is not None:
+        parts.append(f"CPU {stage['cpu']:.2f} s")
+    if stage['rss'] is not None:
+        parts.append(f"{stage['rss'] / 1024 ** 2:.0f} MB")
+    return ', '.join(parts)
+
+
+def log(directory: str, **record):
+    # one JSON object per line, appended
+    record['time'] = time.time()
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, LOG_NAME), 'a', encoding='utf-8') as f:
+        f.write(json.dumps(record) + '\n')
@@ -0,0 +1,118 @@
+# transfer.py
+#
+# Copyright 2026 Golodnikov Sergey
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty
+# of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+
+# placing a result at its destination with as little copying as possible:
+# a hard link on the same file system, a reflink, an in-kernel copy and
+# a streamed copy as the last resort; the destination is replaced
+# atomically and the source stays in place (preview, cache)
+
+import errno
+import fcntl
+import os
+import shutil
+import tempfile
+
+
+FICLONE = 0x40049409  # linux/fs.h
+CHUNK = 1024 ** 2
+
+# errors that mean "not supported here", the next method is tried
+UNSUPPORTED = (
+    errno.EXDEV, errno.EPERM, errno.EOPNOTSUPP, errno.ENOTSUP,
+    errno.EINVAL, errno.ENOSYS, errno.EMLINK, errno.ENOTTY,
+    errno.EBADF,
+)
+
+
+def unique(path: str):
+    # name-1.gif, name-2.gif, ... if the file exists
+    base, ext = os.path.splitext(path)
+    n = 1
+    while os.path.exists(path):
+        path = f'{base}-{n}{ext}'
+        n += 1
+    return path
+
+
+def link(src: str, dst: str, _progress=None):
+    os.unlink(dst)
+    os.link(src, dst)
+
+
+def reflink(src: str, dst: str, _progress=None):
+    with open(src, 'rb') as s, open(dst, 'wb') as d:
+        fcntl.ioctl(d.fileno(), FICLONE, s.fileno())
+
+
+def copy_range(src: str, dst: str, progress=None):
+    with open(src, 'rb') as s, open(dst, 'wb') as d:
+        size, done = os.fstat(s.fileno()).st_size, 0
+        while done < size:
+            n = os.copy_file_range(s.fileno(), d.fileno(), CHUNK * 16)
+            if n == 0:
+                break
+            done += n
+            if progress is not None:
+                progress(done / size)
+
+
+def stream(src: str, dst: str, progress=None):
+    with open(src, 'rb') as s, open(dst, 'wb') as d:
+        size, done = os.fstat(s.fileno()).st_size, 0
+        while chunk := s.read(CHUNK):
+            d.write(chunk)
+            done += len(chunk)
+            if progress is not None and size:
+                progress(done / size)
+
+
+def place(src: str, dst: str, progress=None):
+    # returns the method that was used; progress(fraction) is called
+    # for the copies only, from the calling thread
+    directory = os.path.dirname(os.path.abspath(dst))
+    fd, tmp = tempfile.mkstemp(
+        prefix=f'.{os.path.basename(dst)}-', dir=directory)
+    os.close(fd)
+    try:
+        methods = [('link', link), ('reflink', reflink)]
+        if hasattr(os, 'copy_file_range'):
+            methods.append(('copy_file_range', copy_range))
+        for name, method in methods:
+            try:
+                method(src, tmp, progress)
+                break
+            except OSError as err:
+                if err.errno not in UNSUPPORTED:
+                    raise
+                if not os.path.exists(tmp):
+                    open(tmp, 'wb').close()
+        else:
+            name = 'copy'
+            stream(src, tmp, progress)
+        if name != 'link':
+            shutil.copymode(src, tmp)
+        os.replace(tmp, dst)
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+        raise
+    return name
@@ -34,9 +34,11 @@ class WindowIF(Adw.ApplicationWindow):
     overlay = Gtk.Template.Child('overlay')
     display = Gtk.Template.Child('display')
     spinner = Gtk.Template.Child('spinner')
+    progress = Gtk.Template.Child('progress')
     external = Gtk.Template.Child('external')
 
     video = Gtk.Template.Child('video')
+    animation = Gtk.Template.Child('animation')
 
     segment = Gtk.Template.Child('segment')
     segment_box_start = Gtk.Template.Child('s-box-start')
@@ -45,12 +47,18 @@ class WindowIF(Adw.ApplicationWindow):
     segment_button_end = Gtk.Template.Child('s-button-end')
     segment_entry_start = Gtk.Template.Child('s-entry-start')
     segment_entry_end = Gtk.Template.Child('s-entry-end')
+    segment_snap = Gtk.Template.Child('s-snap')
+    segment_add = Gtk.Template.Child('s-add')
+    segment_clear = Gtk.Template.Child('s-clear')
+    keyframes = Gtk.Template.Child('keyframes')
 
     open_file = Gtk.Template.Child('open-file')
     save_file = Gtk.Template.Child('save-file')
 
     generate = Gtk.Template.Child('generate')
+    draft = Gtk.Template.Child('draft')
     preview = Gtk.Template.Child('preview')
+    details = Gtk.Template.Child('details')
 
     image_size = Gtk.Template.Child('image-size')
     image_width = Gtk.Template.Child('image-width')
@@ -68,10 +76,32 @@ class WindowIF(Adw.ApplicationWindow):
 
     pref_theme = Gtk.Template.Child('pref-theme')
     detect_size = Gtk.Template.Child('detect-size')
+    proxy = Gtk.Template.Child('proxy')
+    output_directory = Gtk.Template.Child('output-directory')
+    output_directory_choose = Gtk.Template.Child('output-directory-choose')
+    output_directory_clear = Gtk.Template.Child('output-directory-clear')
 
     accurate_rnd = Gtk.Template.Child('accurate-rnd')
     stats_mode = Gtk.Template.Child('stats-mode')
+    palette_sampling = Gtk.Template.Child('palette-sampling')
+    palette_sampling_value = Gtk.Template.Child('palette-sampling-value')
+    palette_budget = Gtk.Template.Child('palette-budget')
     bayer_scale = Gtk.Template.Child('bayer-scale')
+    optimize = Gtk.Template.Child('optimize')
+    decimate = Gtk.Template.Child('decimate')
+    decimate_threshold = Gtk.Template.Child('decimate-threshold')
+    engine = Gtk.Template.Child('engine')
+    single_pass = Gtk.Template.Child('single-pass')
+    parallel = Gtk.Template.Child('parallel')
+    renditions = Gtk.Template.Child('renditions')
+    result_cache = Gtk.Template.Child('result-cache')
+    target_size = Gtk.Template.Child('target-size')
+    timing_log = Gtk.Template.Child('timing-log')
+
+    draft_live = Gtk.Template.Child('draft-live')
+    draft_width = Gtk.Template.Child('draft-width')
+    draft_fps = Gtk.Template.Child('draft-fps')
+    draft_duration = Gtk.Template.Child('draft-duration')
 
     webp_lossless = Gtk.Template.Child('webp-lossless')
     webp_quality = Gtk.Template.Child('webp-quality')
@@ -82,6 +112,31 @@ class WindowIF(Adw.ApplicationWindow):
     ts_size = _('Done, image size in MB:')
     ts_save = _('Saved:')
     ts_save_show = _('Show in Files')
+    ts_save_button = _('Save')
+    ts_saving = _('Saving: {}%')
+    ts_output_none = _('Not selected, results are saved manually')
+    ts_generate = _('Generate')
+    ts_queue = _('Running: {}, queued: {}')
+    ts_show = _('Show')
+    ts_progress = _('{}%, {} fps, {} left')
+    ts_cached = _('from cache')
+    ts_cache_stats = _('Hits: {}, misses: {}')
+    ts_estimate = _('Estimating the size…')
+    ts_predicted = _('predicted {} MB')
+    ts_total = _('Total: {:.2f} s')
+    ts_dropped = _('{} of {} frames dropped')
+    ts_renditions = _('Renditions: {}')
+    ts_rendition_error = _('Rendition set')
+    ts_timing_error = _('Timing log')
+    ts_segments = _('Segments: {}')
+    ts_engine_missing = _('PyAV is not installed, ffmpeg is used')
+    ts_numpy_missing = _('NumPy is not installed, palettegen is used')
+    ts_optimize_gif = (_('None'), _('Changed rectangles'))
+    ts_decoded = _('{:.0f} s less decoded')
+    ts_draft = _('Draft')
+    ts_preview = _('Preview')
+    ts_preview_draft = _('Preview (draft)')
+    ts_preview_error = _('Preview error')
     ts_src = _('Source')
     ts_comment = _('Application for converting video files to '
                    'high-quality animated images.')